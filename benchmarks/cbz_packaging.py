@@ -0,0 +1,109 @@
+"""
+Compare deflating every .cbz entry against the content-aware policy.
+
+A set of chapters is packaged twice with FileHandler.make_cbz, once with
+every page deflated and once with CompressionPolicy storing the already
+compressed pages, reporting the build time and total size of each. The
+pages are read from --images if given, otherwise JPEG-like pages with
+random, incompressible bodies are generated.
+
+Usage:
+    python -m benchmarks.cbz_packaging [options]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from manga_dl.utilities.compression import CompressionPolicy
+from manga_dl.utilities.file_handler import FileHandler
+
+
+class DeflateAll(CompressionPolicy):
+    """The previous behaviour, every entry is deflated."""
+
+    def compression(self, header):
+        return zipfile.ZIP_DEFLATED, self.compression_level
+
+
+def make_chapters(directory, args):
+    """Write the sample chapters and return their directories."""
+    if args.images:
+        pages = [
+            os.path.join(args.images, name) for name in sorted(os.listdir(args.images))
+        ]
+    else:
+        pages = []
+        for i in range(args.pages):
+            path = os.path.join(directory, f"sample{i}.jpg")
+            with open(path, "wb") as writer:
+                writer.write(b"\xff\xd8\xff\xe0" + os.urandom(args.size))
+            pages.append(path)
+
+    chapters = []
+    for chapter in range(args.chapters):
+        chapter_dir = os.path.join(directory, "tmp", f"Ch. {chapter}")
+        os.makedirs(chapter_dir)
+        for i, page in enumerate(pages):
+            extension = os.path.splitext(page)[1]
+            shutil.copyfile(page, os.path.join(chapter_dir, f"{i:03d}{extension}"))
+        chapters.append(chapter_dir)
+
+    return chapters
+
+
+def package(log, policy, chapters, comic_info_path, output_dir):
+    """Package every chapter, returning the wall time and total size."""
+    os.makedirs(output_dir)
+    file_handler = FileHandler(log, policy)
+
+    start = time.perf_counter()
+    for chapter_dir in chapters:
+        file_handler.make_cbz(chapter_dir, output_dir, None, comic_info_path)
+    elapsed = time.perf_counter() - start
+
+    size = sum(
+        os.path.getsize(os.path.join(output_dir, name))
+        for name in os.listdir(output_dir)
+    )
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chapters", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--size", type=int, default=300000)
+    parser.add_argument("--level", type=int, default=6)
+    parser.add_argument("--images", help="directory of sample pages to use")
+    args = parser.parse_args()
+
+    log = logging.getLogger("benchmark")
+    directory = tempfile.mkdtemp(prefix="manga_dl_bench_")
+    try:
+        chapters = make_chapters(directory, args)
+        file_handler = FileHandler(log)
+        file_handler.create_comic_info("bench", ["Action"], "Summary", directory)
+        comic_info_path = os.path.join(directory, "ComicInfo.xml")
+
+        for name, policy in (
+            ("deflate", DeflateAll(args.level)),
+            ("policy", CompressionPolicy(args.level)),
+        ):
+            elapsed, size = package(
+                log, policy, chapters, comic_info_path, os.path.join(directory, name)
+            )
+            print(
+                f"{name:<8} {elapsed:8.2f}s {len(chapters) / elapsed:8.1f} chapters/s "
+                f"{size / 1024**2:10.1f} MB"
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Run manga_dl end to end against the local stand-in websites.
+
+The stand-in server of benchmarks.standin_sites is started in a separate
+process and manga_dl.py --run downloads every series of the chosen
+website families from it, in its own process with a config written to a
+temporary directory whose [HostOverrides] send every request to the
+server. Reports chapters, images and bytes per second, the p50 and p99
+latency of the requests as served, the time manga_dl spent in every stage
+and the peak RSS of manga_dl.
+
+Usage:
+    python -m benchmarks.end_to_end [options]
+"""
+
+import argparse
+import configparser
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import zipfile
+
+from benchmarks.standin_sites import FAMILIES, hosts, serve, series_url
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_config(directory, args, families):
+    """Write the config and series list, returning the config path."""
+    mangas = os.path.join(directory, "manga.txt")
+    with open(mangas, "w", encoding="utf-8") as writer:
+        for family in families:
+            for index in range(args.series):
+                writer.write(f"{series_url(family, index)}\n")
+
+    config = configparser.ConfigParser()
+    config["General"] = {
+        "mangas": mangas,
+        "save_location": os.path.join(directory, "manga"),
+        "multi_threaded": "True",
+        "num_threads": str(args.num_threads),
+        "image_threads": str(args.image_threads),
+        "series_threads": str(args.series_threads),
+        "engine": args.engine,
+        "stream_cbz": str(args.stream_cbz),
+        "mangadex_min_speed": "0",
+        "schedule": "720",
+    }
+    config["HostOverrides"] = {
+        host: f"http://127.0.0.1:{args.port}/{host}" for host in hosts(families)
+    }
+    path = os.path.join(directory, "config.ini")
+    with open(path, "w", encoding="utf-8") as writer:
+        config.write(writer)
+
+    return path
+
+
+def count_output(save_location):
+    """Return the number of chapters and images downloaded."""
+    chapters = images = 0
+    for root, _, files in os.walk(save_location):
+        if os.path.basename(root) == "tmp":
+            continue
+        for name in files:
+            if name.endswith(".cbz"):
+                chapters += 1
+                with zipfile.ZipFile(os.path.join(root, name)) as cbz:
+                    images += sum(
+                        1 for entry in cbz.namelist() if entry != "ComicInfo.xml"
+                    )
+
+    return chapters, images
+
+
+def retries_line(directory):
+    """Return the retry stats logged by the run."""
+    log_dir = os.path.join(directory, "logs")
+    for name in sorted(os.listdir(log_dir)) if os.path.isdir(log_dir) else []:
+        with open(os.path.join(log_dir, name), "r", encoding="utf-8") as reader:
+            for line in reader:
+                if " - Retries: " in line:
+                    return line.split(" - Retries: ")[1].split(" - ")[0]
+    return "unknown"
+
+
+def stage_times(directory):
+    """Return the calls and seconds per stage from the metrics of the run."""
+    path = os.path.join(directory, "metrics.json")
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r", encoding="utf-8") as reader:
+        metrics = json.load(reader)
+
+    stages = {}
+    for sample in metrics["stages"]:
+        count, seconds = stages.get(sample["stage"], (0, 0.0))
+        stages[sample["stage"]] = (count + sample["count"], seconds + sample["seconds"])
+
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--families",
+        default=",".join(FAMILIES),
+        help="comma separated website families, all by default",
+    )
+    parser.add_argument("--series", type=int, default=1, help="series per family")
+    parser.add_argument("--chapters", type=int, default=10)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--image-size", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--bandwidth", type=int, default=0, help="KB/s per response")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--num-threads", type=int, default=10)
+    parser.add_argument("--image-threads", type=int, default=4)
+    parser.add_argument("--series-threads", type=int, default=1)
+    parser.add_argument("--stream-cbz", action="store_true")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--keep", action="store_true", help="keep the output")
+    args = parser.parse_args()
+
+    families = [family.strip() for family in args.families.split(",")]
+    server = multiprocessing.Process(
+        target=serve,
+        args=(args.port,),
+        kwargs={
+            "chapters": args.chapters,
+            "images": args.images,
+            "image_size": args.image_size,
+            "latency": args.latency,
+            "bandwidth": args.bandwidth * 1024,
+            "error_rate": args.error_rate,
+            "throttle_rate": args.throttle_rate,
+        },
+        daemon=True,
+    )
+    server.start()
+    time.sleep(0.5)
+
+    directory = tempfile.mkdtemp(prefix="manga_dl_bench_")
+    try:
+        config_path = write_config(directory, args, families)
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "manga_dl.py", "--run", "--config", config_path],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        elapsed = time.perf_counter() - start
+        peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{args.port}/__stats") as r:
+            stats = json.load(r)
+        chapters, images = count_output(os.path.join(directory, "manga"))
+        expected = len(families) * args.series * args.chapters
+
+        print(f"engine      {args.engine}, {', '.join(families)}")
+        print(f"wall time   {elapsed:8.2f}s")
+        print(f"chapters    {chapters:8d} of {expected}, {chapters / elapsed:.2f}/s")
+        print(f"images      {images:8d}, {images / elapsed:.1f}/s")
+        print(f"bytes       {stats['image_bytes'] / 1024**2 / elapsed:8.2f} MB/s")
+        print(
+            f"latency     p50 {stats['latency']['p50'] * 1000:.1f}ms, "
+            f"p99 {stats['latency']['p99'] * 1000:.1f}ms, images p50 "
+            f"{stats['image_latency']['p50'] * 1000:.1f}ms, "
+            f"p99 {stats['image_latency']['p99'] * 1000:.1f}ms"
+        )
+        print(f"requests    {stats['requests']:8d}, statuses {stats['statuses']}")
+        print(f"retries     {retries_line(directory)}")
+        for stage, (count, seconds) in sorted(stage_times(directory).items()):
+            print(
+                f"{stage:<15} {count:5d} calls, {seconds:8.2f}s, "
+                f"{seconds / count * 1000:.1f}ms each"
+            )
+        print(f"peak RSS    {peak_rss:8.1f} MB")
+        if result.returncode != 0:
+            print(f"manga_dl exited with {result.returncode}")
+            print(result.stderr[-2000:])
+        if args.keep:
+            print(f"output      {directory}")
+    finally:
+        server.terminate()
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
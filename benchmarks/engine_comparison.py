@@ -0,0 +1,206 @@
+"""
+Compare the thread engine against the asyncio engine.
+
+A local image server with a fixed per-request latency is started in a
+separate process and the same set of chapters is downloaded with both
+engines, reporting wall time, images per second and peak thread count.
+
+Usage:
+    python -m benchmarks.engine_comparison [options]
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import http.server
+import logging
+import multiprocessing
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+
+import aiohttp
+
+from manga_dl.utilities.async_engine import AsyncImageDownloader
+from manga_dl.utilities.image_downloader import ImageDownloader
+from manga_dl.utilities.session_pool import SessionPool
+
+
+class NullProgress:
+    """Progress replacement that renders nothing."""
+
+    def add_task(self, description, total):
+        return 0
+
+    def update(self, taskId, advance):
+        pass
+
+    def add_bytes(self, taskId, size):
+        pass
+
+    def flush_bytes(self):
+        pass
+
+    def remove_task(self, taskId):
+        pass
+
+
+class ThreadPeak:
+    """Sample the number of live threads in the background."""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def serve_images(port, latency, size):
+    """Serve fake JPEG images after sleeping for latency seconds."""
+    body = b"\xff\xd8\xff\xe0" + os.urandom(size)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    Server(("127.0.0.1", port), Handler).serve_forever()
+
+
+def chapter_images(port, chapters, images):
+    return [
+        [f"http://127.0.0.1:{port}/img/{c}/{i:03d}.jpg" for i in range(images)]
+        for c in range(chapters)
+    ]
+
+
+def run_threads(log, chapters, save_location, args):
+    session_pool = SessionPool(log, pool_size=args.threads)
+    download_slots = threading.BoundedSemaphore(args.threads)
+    downloader = ImageDownloader(
+        log, {}, session_pool, args.image_threads, download_slots
+    )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.threads) as executor:
+        futures = [
+            executor.submit(
+                downloader.download_images,
+                images,
+                "bench",
+                "bench",
+                chapter,
+                save_location,
+                NullProgress(),
+                0,
+            )
+            for chapter, images in enumerate(chapters)
+        ]
+        results = [future.result() for future in futures]
+
+    session_pool.close()
+    return all(results)
+
+
+async def run_asyncio(log, chapters, save_location, args):
+    image_slots = asyncio.Semaphore(args.connections)
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(connector=connector) as client:
+        downloader = AsyncImageDownloader(log, {}, client, image_slots)
+        results = await asyncio.gather(
+            *(
+                downloader.download_images(
+                    images,
+                    "bench",
+                    "bench",
+                    chapter,
+                    save_location,
+                    NullProgress(),
+                    0,
+                )
+                for chapter, images in enumerate(chapters)
+            )
+        )
+
+    return all(results)
+
+
+def report(name, elapsed, total_images, peak_threads, completed):
+    print(
+        f"{name:<8} {elapsed:8.2f}s {total_images / elapsed:10.1f} img/s "
+        f"{peak_threads:6d} threads {'ok' if completed else 'INCOMPLETE'}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chapters", type=int, default=20)
+    parser.add_argument("--images", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--image-threads", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    log = logging.getLogger("benchmark")
+    server = multiprocessing.Process(
+        target=serve_images,
+        args=(args.port, args.latency, args.size),
+        daemon=True,
+    )
+    server.start()
+    time.sleep(0.5)
+
+    chapters = chapter_images(args.port, args.chapters, args.images)
+    total_images = args.chapters * args.images
+    save_location = tempfile.mkdtemp(prefix="manga_dl_bench_")
+
+    try:
+        with ThreadPeak() as peak:
+            start = time.perf_counter()
+            completed = run_threads(log, chapters, save_location, args)
+            elapsed = time.perf_counter() - start
+        report("threads", elapsed, total_images, peak.peak, completed)
+
+        shutil.rmtree(save_location)
+        with ThreadPeak() as peak:
+            start = time.perf_counter()
+            completed = asyncio.run(run_asyncio(log, chapters, save_location, args))
+            elapsed = time.perf_counter() - start
+        report("asyncio", elapsed, total_images, peak.peak, completed)
+
+    finally:
+        shutil.rmtree(save_location, ignore_errors=True)
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Compare a Chrome per chapter against the reusable driver pool for Kaiscans.
+
+A local server serves chapter pages whose reader inserts the images into
+#readerarea from a script after a delay, like the real site. The chapters
+are read once the old way, starting a new Chrome per chapter and sleeping
+a fixed five seconds, and once with Kaiscans and a DriverPool, reporting
+the wall time and seconds per chapter. Chrome and chromedriver must be
+installed.
+
+Usage:
+    python -m benchmarks.kaiscans_drivers [options]
+"""
+
+import argparse
+import concurrent.futures
+import http.server
+import logging
+import multiprocessing
+import shutil
+import socketserver
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+from selenium import webdriver
+
+from manga_dl.utilities.driver_pool import DriverPool
+from manga_dl.utilities.sites.kaiscans import Kaiscans
+
+PAGE = """<html><body><div id="readerarea"></div><script>
+setTimeout(function () {
+    var reader = document.getElementById("readerarea");
+    for (var i = 0; i < %(images)d; i++) {
+        var img = document.createElement("img");
+        img.setAttribute("data-src", "/img/" + i + ".jpg");
+        reader.appendChild(img);
+    }
+}, %(delay)d);
+</script></body></html>"""
+
+
+def serve_pages(port, images, delay):
+    """Serve chapter pages until the process is terminated."""
+    body = (PAGE % {"images": images, "delay": delay * 1000}).encode()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+        daemon_threads = True
+
+    Server(("127.0.0.1", port), Handler).serve_forever()
+
+
+def read_chapter_per_browser(chapter_url, profile_dir, wait):
+    """The previous behaviour, a new Chrome and a fixed sleep per chapter."""
+    options = webdriver.ChromeOptions()
+    options.add_argument("headless")
+    options.add_argument("no-sandbox")
+    options.add_argument("disable-dev-shm-usage")
+    options.add_argument(f"user-data-dir={tempfile.mkdtemp(dir=profile_dir)}")
+    driver = webdriver.Chrome(options=options)
+    driver.get(chapter_url)
+    time.sleep(wait)
+    soup = BeautifulSoup(driver.page_source, "html.parser")
+    images = soup.find("div", id="readerarea").find_all("img")
+    driver.quit()
+    return images
+
+
+def run(name, read_chapter, chapter_urls, threads):
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(read_chapter, chapter_urls))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<8} {elapsed:8.2f}s {elapsed / len(chapter_urls):8.2f}s/chapter "
+        f"{'ok' if all(results) else 'INCOMPLETE'}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chapters", type=int, default=10)
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--sleep", type=float, default=5)
+    parser.add_argument("--drivers", type=int, default=2)
+    parser.add_argument("--max-pages", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    log = logging.getLogger("benchmark")
+    server = multiprocessing.Process(
+        target=serve_pages,
+        args=(args.port, args.images, args.delay),
+        daemon=True,
+    )
+    server.start()
+    time.sleep(0.5)
+
+    chapter_urls = [
+        f"http://127.0.0.1:{args.port}/chapter-{chapter}/"
+        for chapter in range(args.chapters)
+    ]
+    profile_dir = tempfile.mkdtemp(prefix="manga_dl_bench_")
+    try:
+        run(
+            "browser",
+            lambda url: read_chapter_per_browser(url, profile_dir, args.sleep),
+            chapter_urls,
+            args.drivers,
+        )
+
+        driver_pool = DriverPool(log, args.drivers, args.max_pages, profile_dir)
+        site = Kaiscans(log, None, driver_pool)
+        run("pool", site.get_chapter_images, chapter_urls, args.drivers)
+        driver_pool.close()
+        print(f"pool started {driver_pool.started} drivers")
+    finally:
+        server.terminate()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Compare parsing whole pages against parsing only what the adapters read.
+
+Every series and chapter page of the site adapters is parsed the previous
+way, the whole page with html.parser, and with the adapter's SoupStrainer,
+with html.parser and with lxml if it is installed. The parse time and the
+peak memory of each are reported, together with whether the adapter reads
+the same data from the page. The pages are read from --pages if it holds
+a saved <page>.html, such as madara-chapter.html, otherwise a page with
+the markup the adapter reads and the usual scripts, menus and sidebars
+around it is generated.
+
+Usage:
+    python -m benchmarks.parse_adapters [options]
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from manga_dl.utilities.parsing import PARSER
+from manga_dl.utilities.sites.kaiscans import Kaiscans
+from manga_dl.utilities.sites.madraNew import MadraNew
+from manga_dl.utilities.sites.mangakakalot import Mangakakalot
+from manga_dl.utilities.sites.manganato import Manganato
+from manga_dl.utilities.sites.webtoons import Webtoons
+
+
+def noise(count):
+    """The scripts, menus and sidebars around the content of a page."""
+    head = "".join(
+        f'<link rel="stylesheet" href="/css/{i}.css"><meta name="m{i}" content="{i}">'
+        for i in range(count // 4)
+    ) + "".join(
+        f"<script>var data{i} = {list(range(count * 4))};</script>" for i in range(5)
+    )
+    menu = "<nav><ul>%s</ul></nav>" % "".join(
+        f'<li class="menu-item"><a href="/genre/{i}">Genre {i}</a></li>'
+        for i in range(count)
+    )
+    sidebar = '<div class="sidebar">%s</div>' % "".join(
+        f'<div class="popular-item"><a href="/series/{i}"><img src="/thumb/{i}.jpg">'
+        f'<span class="title">Popular series {i}</span></a>'
+        f'<span class="rating">4.{i % 10}</span></div>'
+        for i in range(count // 2)
+    )
+    footer = "<footer>%s<!-- analytics --></footer>" % "".join(
+        f'<p class="footer-text">Footer line {i}</p>' for i in range(count // 4)
+    )
+    return head, menu, sidebar, footer
+
+
+def page(content, count):
+    head, menu, sidebar, footer = noise(count)
+    return (
+        f"<html><head>{head}</head><body>{menu}"
+        f'<div class="main">{content}</div>{sidebar}{footer}</body></html>'
+    )
+
+
+def chapter_rows(template, chapters):
+    return "".join(template.format(i=i) for i in range(chapters))
+
+
+def images(template, count):
+    return "".join(template.format(i=i) for i in range(count))
+
+
+def cases(args):
+    """Return the sample pages with their strainer and the data read from them."""
+    madara_series = (
+        '<div class="post-title"><h1>Series</h1></div>'
+        '<div class="genres-content"><a>Action</a><a>Drama</a></div>'
+        '<div class="summary__content show-more"><p>Summary</p></div>'
+    )
+    kaiscans_series = (
+        '<div id="titlemove"><h1>Series</h1></div>'
+        '<div class="wd-full"><a>Action</a><a>Drama</a></div>'
+        '<div itemprop="description"><p>Summary</p></div>'
+        '<div class="eplister"><ul>%s</ul></div>'
+        % chapter_rows(
+            '<li data-num="{i}"><a href="/series-chapter-{i}/">Chapter {i}</a></li>',
+            args.chapters,
+        )
+    )
+    webtoons_series = (
+        '<div class="info"><h2>Drama</h2><h1 class="subj">Series</h1></div>'
+        '<p class="summary">Summary</p>'
+        '<a id="_btnEpisode" href="/viewer?episode_no=1">First episode</a>'
+        "<ul>%s</ul>"
+        % chapter_rows(
+            '<li class="_episodeItem" data-episode-no="{i}">'
+            '<a href="/viewer?episode_no={i}">Episode {i}</a></li>',
+            args.chapters,
+        )
+    )
+    manganato_series = (
+        '<div class="story-info-right"><h1>Series</h1></div>'
+        '<div class="panel-story-info-description">Summary</div>'
+        '<ul class="row-content-chapter">%s</ul>'
+        % chapter_rows(
+            '<li class="a-h"><a href="/manga/chapter-{i}">Chapter {i}</a></li>',
+            args.chapters,
+        )
+    )
+    mangakakalot_series = (
+        '<ul class="manga-info-text"><li><h1>Series</h1></li></ul>'
+        '<div class="chapter-list">%s</div>'
+        % chapter_rows(
+            '<div class="row"><span><a href="/chapter/manga/chapter_{i}">'
+            "Chapter {i}</a></span></div>",
+            args.chapters,
+        )
+    )
+
+    def madara_series_data(soup):
+        return (
+            soup.find("div", {"class": "post-title"}).h1.text,
+            [a.text for a in soup.find("div", {"class": "genres-content"})("a")],
+            soup.find("div", {"class": "summary__content show-more"}).p.text,
+        )
+
+    def image_sources(node, attribute="src"):
+        return [img.get(attribute) for img in node.find_all("img")]
+
+    return [
+        (
+            "madara-series",
+            madara_series,
+            MadraNew.series_page,
+            madara_series_data,
+        ),
+        (
+            "madara-chapter",
+            '<div class="reading-content">%s</div>'
+            % images('<img data-src="/wp-content/{i}.jpg">', args.images),
+            MadraNew.chapter_page,
+            lambda soup: image_sources(
+                soup.find("div", {"class": "reading-content"}), "data-src"
+            ),
+        ),
+        (
+            "manganato-series",
+            manganato_series,
+            Manganato.series_page,
+            lambda soup: [
+                a["href"]
+                for a in soup.find("ul", {"class": "row-content-chapter"})("a")
+            ],
+        ),
+        (
+            "manganato-chapter",
+            '<div class="container-chapter-reader">%s</div>'
+            % images('<img src="https://v1.mkklcdn.com/{i}.jpg">', args.images),
+            Manganato.chapter_page,
+            lambda soup: image_sources(
+                soup.find("div", {"class": "container-chapter-reader"})
+            ),
+        ),
+        (
+            "mangakakalot-series",
+            mangakakalot_series,
+            Mangakakalot.series_page,
+            lambda soup: [
+                a["href"] for a in soup.find("div", {"class": "chapter-list"})("a")
+            ],
+        ),
+        (
+            "kaiscans-series",
+            kaiscans_series,
+            Kaiscans.series_page,
+            lambda soup: [
+                li.get("data-num")
+                for li in soup.find("div", class_="eplister").find_all("li")
+            ],
+        ),
+        (
+            "kaiscans-chapter",
+            '<div id="readerarea">%s</div>'
+            % images('<img src="https://cdn.kaiscans.com/{i}.jpg">', args.images),
+            Kaiscans.chapter_page,
+            lambda soup: image_sources(soup.find("div", id="readerarea")),
+        ),
+        (
+            "webtoons-series",
+            webtoons_series,
+            Webtoons.series_page,
+            lambda soup: (
+                soup.find(class_="subj").text,
+                len(soup.find_all("li", {"class": "_episodeItem"})),
+            ),
+        ),
+        (
+            "webtoons-chapter",
+            '<div class="viewer_img _img_viewer_area">%s</div>'
+            % images(
+                '<img data-url="https://webtoon-phinf.pstatic.net/{i}.jpg">',
+                args.images,
+            ),
+            Webtoons.chapter_page,
+            lambda soup: image_sources(
+                soup.find("div", class_="viewer_img _img_viewer_area"), "data-url"
+            ),
+        ),
+    ]
+
+
+def measure(markup, features, parse_only, repeat):
+    """Return the mean parse time, the peak memory and the parsed document."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        BeautifulSoup(markup, features, parse_only=parse_only)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    soup = BeautifulSoup(markup, features, parse_only=parse_only)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed, peak, soup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--images", type=int, default=60)
+    parser.add_argument("--noise", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", help="directory of saved <page>.html files")
+    args = parser.parse_args()
+
+    runs = [("full", "html.parser", False), ("strained", "html.parser", True)]
+    if PARSER != "html.parser":
+        runs.append(("strained", PARSER, True))
+
+    print(f"{'page':<20} {'KB':>6}", end="")
+    for name, features, _ in runs:
+        print(f"  {name + ' ' + features:>22}", end="")
+    print("  same")
+
+    for name, content, strainer, read in cases(args):
+        saved = os.path.join(args.pages or "", f"{name}.html")
+        if args.pages and os.path.exists(saved):
+            with open(saved, "r", encoding="utf-8") as reader:
+                markup = reader.read()
+        else:
+            markup = page(content, args.noise)
+
+        print(f"{name:<20} {len(markup) / 1024:6.0f}", end="")
+        results = []
+        for _, features, strained in runs:
+            elapsed, peak, soup = measure(
+                markup, features, strainer if strained else None, args.repeat
+            )
+            try:
+                results.append(read(soup))
+            except (AttributeError, TypeError, KeyError):
+                results.append(None)
+            print(f"  {elapsed * 1000:10.1f}ms {peak / 1024**2:7.1f}MB", end="")
+
+        print(f"  {'yes' if all(r == results[0] for r in results) else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+"""
+A local stand-in for the websites manga_dl downloads from.
+
+A single HTTP server answers for every host of every supported website
+family, the host being the first part of the path, so the requests of a
+real series URL arrive as /<host>/<path> once [HostOverrides] points the
+host at the server. Series pages, chapter lists, chapter pages, the
+MangaDex API and the image CDNs are generated from the series URL, with a
+configurable latency, bandwidth, error rate and 429 rate.
+
+GET /__stats returns the requests served so far as JSON.
+
+Usage:
+    python -m benchmarks.standin_sites [options]
+"""
+
+import argparse
+import http.server
+import json
+import random
+import socketserver
+import statistics
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+# The hosts each website family is served from, the series page host first.
+FAMILIES = {
+    "madara": ["manhuaus.com", "cdn.manhuaus.com"],
+    "madara-old": ["manhuaes.com", "cdn.manhuaes.com"],
+    "manganato": ["manganato.com", "chapmanganato.to", "v1.mkklcdn.com"],
+    "mangakakalot": ["mangakakalot.com", "v1.mkklcdn.com"],
+    "webtoons": ["www.webtoons.com", "webtoon-phinf.pstatic.net"],
+    "mangadex": [
+        "mangadex.org",
+        "api.mangadex.org",
+        "uploads.mangadex.network",
+        "api.mangadex.network",
+    ],
+    "kaiscans": ["kaiscans.com", "cdn.kaiscans.com"],
+}
+
+IMAGE_HOSTS = {
+    "cdn.manhuaus.com",
+    "cdn.manhuaes.com",
+    "v1.mkklcdn.com",
+    "webtoon-phinf.pstatic.net",
+    "uploads.mangadex.network",
+    "cdn.kaiscans.com",
+}
+
+
+def hosts(families):
+    """Return every host the given website families are served from."""
+    return sorted({host for family in families for host in FAMILIES[family]})
+
+
+def mangadex_id(*parts):
+    """Return a stable version 4 UUID for parts."""
+    value = random.Random("/".join(map(str, parts))).getrandbits(128)
+    return str(uuid.UUID(int=value, version=4))
+
+
+def series_url(family, index):
+    """Return the URL of the index-th series of a website family."""
+    slug = f"series-{index}"
+    return {
+        "madara": f"https://manhuaus.com/manga/{slug}",
+        "madara-old": f"https://manhuaes.com/manga/{slug}",
+        "manganato": f"https://manganato.com/manga-{slug}",
+        "mangakakalot": f"https://mangakakalot.com/manga/{slug}",
+        "webtoons": (
+            f"https://www.webtoons.com/en/fantasy/{slug}/list?title_no={index + 1}"
+        ),
+        "mangadex": f"https://mangadex.org/title/{mangadex_id(slug)}/{slug}",
+        "kaiscans": f"https://kaiscans.com/manga/{slug}",
+    }[family]
+
+
+def page(title, content):
+    """Return a page with content among the usual menus and sidebars."""
+    menu = "".join(
+        f'<li class="menu-item"><a href="/genre/{i}">Genre {i}</a></li>'
+        for i in range(100)
+    )
+    sidebar = "".join(
+        f'<div class="popular-item"><a href="/series/{i}"><img src="/t/{i}.jpg">'
+        f"<span>Popular {i}</span></a></div>"
+        for i in range(40)
+    )
+    return (
+        f"<html><head><title>{title}</title>"
+        f"<script>var config = {list(range(500))};</script></head>"
+        f"<body><nav><ul>{menu}</ul></nav><div class='main'>{content}</div>"
+        f"<div class='sidebar'>{sidebar}</div></body></html>"
+    )
+
+
+class StandInSites:
+    """
+    The pages, API responses and images of the stand-in websites.
+
+    Attributes:
+        chapters: The number of chapters of every series.
+        images: The number of images of every chapter.
+        image_size: The size of every image in bytes.
+        latency: The seconds waited before every response.
+        bandwidth: The bytes per second every response is sent at, 0 for
+            no limit.
+        error_rate: The share of requests answered with a 500.
+        throttle_rate: The share of requests answered with a 429.
+    """
+
+    def __init__(
+        self,
+        chapters=10,
+        images=20,
+        image_size=100000,
+        latency=0.02,
+        bandwidth=0,
+        error_rate=0.0,
+        throttle_rate=0.0,
+        seed=0,
+    ):
+        self.chapters = chapters
+        self.images = images
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.image = b"\xff\xd8\xff\xe0" + random.Random(seed).randbytes(image_size)
+        self._random = random.Random(seed)
+        self._records = []
+        self._lock = threading.Lock()
+
+    def fault(self):
+        """Return the status of an injected failure, None to answer normally."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def record(self, kind, status, size, duration):
+        with self._lock:
+            self._records.append((kind, status, size, duration))
+
+    def stats(self):
+        """Return the requests served so far."""
+        with self._lock:
+            records = list(self._records)
+
+        def percentiles(durations):
+            if len(durations) < 2:
+                return {"p50": sum(durations), "p99": sum(durations)}
+            cuts = statistics.quantiles(durations, n=100)
+            return {"p50": cuts[49], "p99": cuts[98]}
+
+        images = [r for r in records if r[0] == "image" and r[1] in (200, 206)]
+        statuses = {}
+        for record in records:
+            statuses[str(record[1])] = statuses.get(str(record[1]), 0) + 1
+
+        return {
+            "requests": len(records),
+            "statuses": statuses,
+            "images": len(images),
+            "image_bytes": sum(r[2] for r in images),
+            "latency": percentiles([r[3] for r in records]),
+            "image_latency": percentiles([r[3] for r in images]),
+        }
+
+    def chapter_range(self):
+        return range(1, self.chapters + 1)
+
+    def route(self, method, host, path, query, body):
+        """
+        Return the kind, status, content type and body of a request.
+        """
+        if host in IMAGE_HOSTS:
+            return "image", 200, "image/jpeg", self.image
+
+        if host == "api.mangadex.network":
+            return "report", 200, "application/json", b'{"result": "ok"}'
+
+        if host == "api.mangadex.org":
+            return self.mangadex_api(path, query)
+
+        handler = {
+            "manhuaus.com": self.madara,
+            "manhuaes.com": self.madara_old,
+            "manganato.com": self.manganato,
+            "chapmanganato.to": self.manganato,
+            "mangakakalot.com": self.mangakakalot,
+            "www.webtoons.com": self.webtoons,
+            "kaiscans.com": self.kaiscans,
+        }.get(host)
+        result = handler(method, path, query, body) if handler else None
+        if result is None:
+            return "page", 404, "text/html", b"Not found"
+
+        return "page", 200, "text/html", page(host, result).encode()
+
+    def madara_series(self, host, slug, data_id=""):
+        return (
+            f'<div id="manga-chapters-holder" data-id="{data_id}"></div>'
+            f'<div class="post-title"><h1> {host} {slug} </h1></div>'
+            '<div class="genres-content"><a>Action</a><a>Fantasy</a></div>'
+            '<div class="summary__content show-more"><p>Summary</p></div>'
+        )
+
+    def madara_chapters(self, host, slug):
+        return "<ul>%s</ul>" % "".join(
+            f'<li class="wp-manga-chapter"><a href="https://{host}/manga/{slug}/'
+            f'chapter-{n}/">Chapter {n}</a></li>'
+            for n in reversed(self.chapter_range())
+        )
+
+    def madara_chapter(self, host, slug, number):
+        return '<div class="reading-content">%s</div>' % "".join(
+            f'<img data-src=" https://cdn.{host}/{slug}/{number}/{i:03d}.jpg ">'
+            for i in range(self.images)
+        )
+
+    def madara(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        if len(parts) == 4 and parts[2:] == ["ajax", "chapters"]:
+            return self.madara_chapters("manhuaus.com", parts[1])
+        if len(parts) == 3 and parts[2].startswith("chapter-"):
+            return self.madara_chapter("manhuaus.com", parts[1], parts[2][8:])
+        if len(parts) == 2:
+            return self.madara_series("manhuaus.com", parts[1])
+        return None
+
+    def madara_old(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        if parts == ["wp-admin", "admin-ajax.php"]:
+            slug = parse_qs(body.decode()).get("manga", [""])[0]
+            return self.madara_chapters("manhuaes.com", slug)
+        if len(parts) == 3 and parts[2].startswith("chapter-"):
+            return self.madara_chapter("manhuaes.com", parts[1], parts[2][8:])
+        if len(parts) == 2:
+            return self.madara_series("manhuaes.com", parts[1], data_id=parts[1])
+        return None
+
+    def manganato(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[1].startswith("chapter-"):
+            return '<div class="container-chapter-reader">%s</div>' % "".join(
+                f'<img src="https://v1.mkklcdn.com/{parts[0]}/{parts[1]}/{i:03d}.jpg">'
+                for i in range(self.images)
+            )
+        if len(parts) == 1:
+            rows = "".join(
+                f'<li class="a-h"><a href="https://chapmanganato.to/{parts[0]}/'
+                f'chapter-{n}">Chapter {n}</a></li>'
+                for n in reversed(self.chapter_range())
+            )
+            return (
+                f'<div class="story-info-right"><h1>Manganato {parts[0]}</h1></div>'
+                '<div class="panel-story-info-description">Summary</div>'
+                f'<ul class="row-content-chapter">{rows}</ul>'
+            )
+        return None
+
+    def mangakakalot(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "chapter":
+            return '<div class="container-chapter-reader">%s</div>' % "".join(
+                f'<img src="https://v1.mkklcdn.com/{parts[1]}/{parts[2]}/{i:03d}.jpg">'
+                for i in range(self.images)
+            )
+        if len(parts) == 2 and parts[0] == "manga":
+            rows = "".join(
+                f'<div class="row"><span><a href="https://mangakakalot.com/chapter/'
+                f'{parts[1]}/chapter_{n}">Chapter {n}</a></span></div>'
+                for n in reversed(self.chapter_range())
+            )
+            return (
+                '<ul class="manga-info-text"><li><h1>Mangakakalot '
+                f"{parts[1]}</h1></li></ul>"
+                f'<div class="chapter-list">{rows}</div>'
+            )
+        return None
+
+    def webtoons(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        title_no = query.get("title_no", ["1"])[0]
+        if len(parts) == 5 and parts[4] == "viewer":
+            episode = query.get("episode_no", ["1"])[0]
+            return '<div class="viewer_img _img_viewer_area">%s</div>' % "".join(
+                f'<img data-url="https://webtoon-phinf.pstatic.net/{parts[2]}/'
+                f'{episode}/{i:03d}.jpg?type=q90">'
+                for i in range(self.images)
+            )
+        if len(parts) == 4 and parts[3] == "list":
+            base = f"https://www.webtoons.com/{'/'.join(parts[:3])}"
+            episodes = "".join(
+                f'<li class="_episodeItem" data-episode-no="{n}"><a href="{base}/'
+                f'episode-{n}/viewer?title_no={title_no}&episode_no={n}">'
+                f"Episode {n}</a></li>"
+                for n in reversed(self.chapter_range())
+            )
+            return (
+                f'<div class="info"><h2>Fantasy</h2><h1 class="subj">Webtoon '
+                f"{parts[2]}</h1></div>"
+                '<p class="summary">Summary</p>'
+                f'<a id="_btnEpisode" href="{base}/episode-1/viewer?'
+                f'title_no={title_no}&episode_no=1">First episode</a>'
+                f"<ul>{episodes}</ul>"
+            )
+        return None
+
+    def kaiscans(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "manga":
+            slug = parts[1]
+            rows = "".join(
+                f'<li data-num="{n}"><a href="https://kaiscans.com/{slug}-chapter-{n}/">'
+                f"Chapter {n}</a></li>"
+                for n in reversed(self.chapter_range())
+            )
+            return (
+                f'<div id="titlemove"><h1>Kaiscans {slug}</h1></div>'
+                '<div class="wd-full"><a>Action</a></div>'
+                '<div itemprop="description"><p>Summary</p></div>'
+                f'<div class="eplister"><ul>{rows}</ul></div>'
+            )
+        if len(parts) == 1 and "-chapter-" in parts[0]:
+            slug, number = parts[0].rsplit("-chapter-", 1)
+            reader = {
+                "sources": [
+                    {
+                        "source": "Server 1",
+                        "images": [
+                            f"https://cdn.kaiscans.com/{slug}/{number}/{i:03d}.jpg"
+                            for i in range(self.images)
+                        ],
+                    }
+                ]
+            }
+            return (
+                '<div id="readerarea"></div>'
+                f"<script>ts_reader.run({json.dumps(reader)});</script>"
+            )
+        return None
+
+    def mangadex_api(self, path, query):
+        parts = path.strip("/").split("/")
+        if parts[0] == "manga" and len(parts) == 2:
+            data = {
+                "data": {
+                    "attributes": {
+                        "title": {"en": f"MangaDex {parts[1][:8]}"},
+                        "altTitles": [],
+                        "tags": [{"attributes": {"name": {"en": "Action"}}}],
+                        "description": {"en": "Summary"},
+                    }
+                }
+            }
+        elif parts[0] == "manga" and len(parts) == 3 and parts[2] == "feed":
+            limit = int(query.get("limit", ["100"])[0])
+            offset = int(query.get("offset", ["0"])[0])
+            numbers = list(self.chapter_range())[offset : offset + limit]
+            data = {
+                "data": [
+                    {
+                        "id": mangadex_id(parts[1], n),
+                        "attributes": {"chapter": str(n)},
+                    }
+                    for n in numbers
+                ],
+                "limit": limit,
+                "offset": offset,
+                "total": self.chapters,
+            }
+        elif parts[:2] == ["at-home", "server"] and len(parts) == 3:
+            files = [f"{i:03d}-{parts[2][:8]}.jpg" for i in range(self.images)]
+            data = {
+                "baseUrl": "https://uploads.mangadex.network",
+                "chapter": {"hash": parts[2], "data": files, "dataSaver": files},
+            }
+        else:
+            return "api", 404, "application/json", b"{}"
+
+        return "api", 200, "application/json", json.dumps(data).encode()
+
+
+def make_handler(sites):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.answer("GET", b"")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.answer("POST", self.rfile.read(length))
+
+        def answer(self, method, body):
+            start = time.perf_counter()
+            parsed = urlparse(self.path)
+            if parsed.path == "/__stats":
+                self.send(200, "application/json", json.dumps(sites.stats()).encode())
+                return
+
+            host, _, path = parsed.path.lstrip("/").partition("/")
+            path = "/" + "/".join(part for part in path.split("/") if part)
+            time.sleep(sites.latency)
+
+            status = sites.fault()
+            if status is None:
+                kind, status, content_type, data = sites.route(
+                    method, host, path, parse_qs(parsed.query), body
+                )
+            else:
+                kind = "image" if host in IMAGE_HOSTS else "page"
+                content_type, data = "text/plain", b"Injected failure"
+
+            self.send(status, content_type, data)
+            sites.record(kind, status, len(data), time.perf_counter() - start)
+
+        def send(self, status, content_type, data):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+
+            if not sites.bandwidth:
+                self.wfile.write(data)
+                return
+
+            chunk_size = 16384
+            for start in range(0, len(data), chunk_size):
+                chunk = data[start : start + chunk_size]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / sites.bandwidth)
+
+    return Handler
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients closing their keep-alive connections are not errors.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(port, **options):
+    """Serve the stand-in websites until the process is terminated."""
+    Server(("127.0.0.1", port), make_handler(StandInSites(**options))).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--chapters", type=int, default=10)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--image-size", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--bandwidth", type=int, default=0, help="KB/s per response")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"Serving on http://127.0.0.1:{args.port}, [HostOverrides]:")
+    for host in hosts(FAMILIES):
+        print(f"{host} = http://127.0.0.1:{args.port}/{host}")
+    serve(
+        args.port,
+        chapters=args.chapters,
+        images=args.images,
+        image_size=args.image_size,
+        latency=args.latency,
+        bandwidth=args.bandwidth * 1024,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,19 +6,37 @@ Usage:
 """
 
 import argparse
+import asyncio
 import concurrent.futures
 import os
 import re
 import signal
 import sys
+import threading
 import time
 from datetime import datetime, timedelta
 from urllib.parse import unquote, urlparse
 
+from manga_dl.utilities.async_engine import AsyncEngine
+from manga_dl.utilities.at_home_reporter import AtHomeReporter
+from manga_dl.utilities.bandwidth_limiter import BandwidthLimiter
+from manga_dl.utilities.checkpoint import ChapterCheckpoint
+from manga_dl.utilities.compression import CompressionPolicy
 from manga_dl.utilities.config import ConfigHandler
+from manga_dl.utilities.driver_pool import DriverPool
+from manga_dl.utilities.http_cache import HttpCache
 from manga_dl.utilities.image_downloader import ImageDownloader
 from manga_dl.utilities.logging import setup_logging
+from manga_dl.utilities.metrics import Metrics, site_of
+from manga_dl.utilities.packager import Packager
+from manga_dl.utilities.page_cache import PageCache
+from manga_dl.utilities.pipeline import ChapterPipeline
+from manga_dl.utilities.poll_schedule import PollSchedule
 from manga_dl.utilities.progress import Progress
+from manga_dl.utilities.rate_limiter import RateLimiter
+from manga_dl.utilities.retry_policy import RetryPolicy
+from manga_dl.utilities.session_pool import SessionPool
+from manga_dl.utilities.state_store import StateStore
 from manga_dl.utilities.sites.kaiscans import Kaiscans
 from manga_dl.utilities.sites.madraNew import MadraNew
 from manga_dl.utilities.sites.madraOld import MadraOld
@@ -46,10 +64,6 @@ class GracefulThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
         super().submit(fn, *args, **kwargs)
 
 
-log = setup_logging()
-
-config = ConfigHandler(log, os.path.join("/config", "config.ini"))
-
 parser = argparse.ArgumentParser(
     description="Download download manga's, manhua's or manhwa's",
     usage="%(prog)s [options]",
@@ -60,13 +74,24 @@ parser.add_argument(
     action="store_true",
     help="Run the script once and exit",
 )
+parser.add_argument(
+    "-c",
+    "--config",
+    default=os.path.join("/config", "config.ini"),
+    help="The config file, the logs, state and caches are kept next to it",
+)
 args = parser.parse_args()
+config_dir = os.path.dirname(os.path.abspath(args.config))
+
+log = setup_logging(os.path.join(config_dir, "logs"))
+
+config = ConfigHandler(log, args.config)
 
 
 def get_website_class(url: str):
     """Return the class for the website based on the URL."""
     if "manhuaes.com" in url or "manhuaaz.com" in url:
-        return MadraOld(log)
+        return MadraOld(log, session_pool)
     elif (
         "manhuaus.com" in url
         or "manhuaus.org" in url
@@ -78,21 +103,21 @@ def get_website_class(url: str):
         or "setsuscans.com" in url
         or "manhwaclan.com" in url
     ):
-        return MadraNew(log)
+        return MadraNew(log, session_pool)
     elif "webtoons.com" in url:
-        return Webtoons(log)
+        return Webtoons(log, session_pool)
     elif "kaiscans.com" in url:
-        return Kaiscans(log)
+        return Kaiscans(log, session_pool, driver_pool)
     elif (
         "mangakakalot.com" in url
         or "chapmanganato.com" in url
         or "readmanganato.com" in url
     ):
-        return Mangakakalot(log)
+        return Mangakakalot(log, session_pool)
     elif "mangadex.org" in url:
-        return Mangadex(log)
+        return Mangadex(log, session_pool, mangadex_data_saver, mangadex_min_speed)
     elif "manganato.com" in url or "chapmanganato.to" in url:
-        return Manganato(log)
+        return Manganato(log, session_pool)
     else:
         raise ValueError(f"Unsupported website: {url}")
 
@@ -110,99 +135,356 @@ save_location = config.get("General", "save_location")
 multi_threaded = config.getboolean("General", "multi_threaded")
 num_threads = config.getint("General", "num_threads")
 schedule = config.getint("General", "schedule")
+image_threads = config.getint("General", "image_threads", fallback=4)
+engine = config.get("General", "engine", fallback="threads")
+async_connections = config.getint("General", "async_connections", fallback=100)
+resolver_threads = config.getint("General", "resolver_threads", fallback=4)
+series_threads = config.getint("General", "series_threads", fallback=1)
+stream_cbz = config.getboolean("General", "stream_cbz", fallback=False)
+compression = CompressionPolicy(
+    config.getint("General", "compression_level", fallback=6)
+)
+packaging_workers = config.getint("General", "packaging_workers", fallback=2)
+packaging_mode = config.get("General", "packaging_mode", fallback="thread")
+selenium_drivers = config.getint("General", "selenium_drivers", fallback=2)
+selenium_max_pages = config.getint("General", "selenium_max_pages", fallback=50)
+mangadex_reports = config.getboolean("General", "mangadex_reports", fallback=True)
+mangadex_data_saver = config.getboolean(
+    "General", "mangadex_data_saver", fallback=False
+)
+mangadex_min_speed = config.getint("General", "mangadex_min_speed", fallback=50)
+
+rate_limiter = RateLimiter(
+    log,
+    {domain: float(rate) for domain, rate in config.items("RateLimits").items()},
+)
+bandwidth_limiter = BandwidthLimiter(
+    log,
+    config.items("Bandwidth"),
+    {
+        section.split(" ", 1)[1]: config.items(section)
+        for section in config.sections()
+        if section.startswith("Bandwidth ")
+    },
+)
+retry_policy = RetryPolicy(
+    log,
+    {
+        rule: int(attempts)
+        for rule, attempts in config.items("Retries").items()
+        if rule not in ("backoff", "max_backoff", "budget")
+    },
+    backoff=float(config.get("Retries", "backoff", fallback="1")),
+    max_backoff=float(config.get("Retries", "max_backoff", fallback="30")),
+    budget=float(config.get("Retries", "budget", fallback="120")),
+)
+page_cache = PageCache(log)
+metrics = Metrics(log)
+metrics_port = config.getint("General", "metrics_port", fallback=0)
+metrics_address = config.get("General", "metrics_address", fallback="127.0.0.1")
+metrics_file = os.path.join(
+    config_dir, config.get("General", "metrics_file", fallback="metrics.json")
+)
+host_overrides = config.items("HostOverrides")
+http_cache = (
+    HttpCache(
+        log,
+        os.path.join(config_dir, ".cache", "http"),
+        max_bytes=config.getint("General", "http_cache_size", fallback=200) * 1024**2,
+    )
+    if config.getboolean("General", "http_cache", fallback=True)
+    else None
+)
+session_pool = SessionPool(
+    log,
+    pool_size=num_threads,
+    rate_limiter=rate_limiter,
+    page_cache=page_cache,
+    http_cache=http_cache,
+    retry_policy=retry_policy,
+    host_overrides=host_overrides,
+    metrics=metrics,
+)
+download_slots = threading.BoundedSemaphore(num_threads * series_threads)
+state_store = StateStore(log, os.path.join(config_dir, "state.db"))
+poll_schedule = (
+    PollSchedule(
+        log,
+        state_store,
+        schedule,
+        PollSchedule.parse_overrides(log, config.items("SeriesPolling")),
+        dormant_days=float(config.get("Polling", "dormant_days", fallback="60")),
+        dormant_hours=float(config.get("Polling", "dormant_hours", fallback="168")),
+        completed_days=float(config.get("Polling", "completed_days", fallback="365")),
+        completed_hours=float(config.get("Polling", "completed_hours", fallback="720")),
+        unknown_hours=float(config.get("Polling", "unknown_hours", fallback="24")),
+    )
+    if config.getboolean("Polling", "adaptive", fallback=True)
+    else None
+)
+driver_pool = DriverPool(
+    log,
+    selenium_drivers,
+    selenium_max_pages,
+    os.path.join(config_dir, ".cache", "selenium"),
+)
+at_home_reporter = AtHomeReporter(log, session_pool) if mangadex_reports else None
+packager = (
+    Packager(log, packaging_workers, packaging_mode, compression, metrics)
+    if packaging_workers > 0
+    else None
+)
+
+
+def get_series_info(manga, manga_url):
+    """
+    Get the chapters, title and metadata of a series.
+
+    If none of the pages the series was read from changed since the last
+    run, the result of the last run is reused without parsing them again.
+    """
+    if http_cache is not None:
+        cached = http_cache.load_series(manga_url)
+        if cached is not None and session_pool.not_modified(cached[0]):
+            chapters, title, genres, summary = cached[1]
+            log.info("%s has not changed since the last run", title)
+            return [tuple(chapter) for chapter in chapters], title, genres, summary
+
+    with session_pool.record_pages() as recorder:
+        chapters, title = manga.get_manga_chapters(manga_url)
+        genres, summary = manga.get_manga_metadata(manga_url)
+
+    if http_cache is not None and recorder["cacheable"] and chapters:
+        http_cache.store_series(
+            manga_url,
+            list(dict.fromkeys(recorder["pages"])),
+            [chapters, title, genres, summary],
+        )
+
+    return chapters, title, genres, summary
+
+
+def download_series(manga_url, progress):
+    """Download the missing chapters of a single series."""
+    manga = get_website_class(manga_url)
+    headers_image = {**manga.headers_image, "referer": manga_url}
+
+    chapters, title, genres, summary = get_series_info(manga, manga_url)
+    chapter_task = progress.add_task(
+        f"Downloading chapters for {title}", total=len(chapters)
+    )
+    sanitized_title = sanitize_title(title)
+
+    complete_dir = os.path.join(save_location, sanitized_title)
+    state_store.register_series(
+        manga_url, title, type(manga).__name__, complete_dir, len(chapters)
+    )
+    state_store.record_releases(
+        manga_url,
+        [number for number, _ in chapters],
+        getattr(manga, "release_dates", None),
+    )
+    downloaded_chapters = state_store.downloaded_chapters(manga_url)
+
+    downloader = ImageDownloader(
+        log,
+        headers_image,
+        session_pool,
+        image_threads,
+        download_slots,
+        stream_cbz,
+        compression,
+        packager,
+        at_home_reporter,
+        getattr(manga, "image_failover", None),
+        bandwidth_limiter,
+        site_of(manga_url),
+    )
+
+    missing_chapters = []
+    for chapter_number, chapter_url in chapters:
+        if str(chapter_number) in downloaded_chapters:
+            log.info(
+                "%s Ch. %s already exists, skipping",
+                title,
+                chapter_number,
+            )
+            progress.update(chapter_task, advance=1)
+            continue
+
+        attempts = state_store.failed_attempts(manga_url, chapter_number)
+        if attempts:
+            log.info(
+                "Retrying %s Ch. %s after %s failed attempts",
+                title,
+                chapter_number,
+                attempts,
+            )
+        missing_chapters.append((chapter_number, chapter_url))
+
+    chapter_urls = dict(missing_chapters)
+    chapter_numbers = {url: number for number, url in missing_chapters}
+
+    images_max_age = getattr(manga, "images_max_age", ChapterCheckpoint.images_max_age)
+
+    def resolve(chapter_url):
+        images = downloader.resumable_images(
+            save_location, sanitized_title, chapter_numbers[chapter_url], images_max_age
+        )
+        if images:
+            return images
+
+        try:
+            with metrics.time("chapter_images", site_of(manga_url)) as sample:
+                images = manga.get_chapter_images(chapter_url)
+                sample["failed"] = not images
+        except Exception as e:
+            state_store.mark_failed(
+                manga_url, chapter_numbers[chapter_url], chapter_url, str(e)
+            )
+            raise
+        if not images:
+            state_store.mark_failed(
+                manga_url, chapter_numbers[chapter_url], chapter_url, "no images found"
+            )
+
+        return images
+
+    packaging = []
+
+    def download_chapter(chapter_number, images):
+        try:
+            packaged = downloader.download_chapter(
+                chapter_number,
+                images,
+                title,
+                sanitized_title,
+                save_location,
+                progress,
+                genres,
+                summary,
+                complete_dir,
+                chapter_task,
+            )
+        except Exception as e:
+            state_store.mark_failed(
+                manga_url, chapter_number, chapter_urls[chapter_number], str(e)
+            )
+            raise
+        packaged.add_done_callback(
+            lambda future: state_store.record_chapter(
+                manga_url,
+                chapter_number,
+                chapter_urls[chapter_number],
+                images,
+                os.path.join(complete_dir, f"Ch. {chapter_number}.cbz"),
+                future.exception() is None and future.result(),
+            )
+        )
+        packaging.append(packaged)
+
+    if multi_threaded:
+        ChapterPipeline(log, resolver_threads, num_threads, queue_size=num_threads).run(
+            missing_chapters, resolve, download_chapter
+        )
+
+    else:
+        for chapter_number, chapter_url in missing_chapters:
+            images = resolve(chapter_url)
+            if not images:
+                log.error("No images found for Ch. %s", chapter_number)
+                continue
+
+            download_chapter(chapter_number, images)
+
+    concurrent.futures.wait(packaging)
+
+
+def group_by_host(manga_urls):
+    """Group series URLs by host, keeping the order of the list."""
+    series_groups = {}
+    for manga_url in manga_urls:
+        series_groups.setdefault(urlparse(manga_url).netloc, []).append(manga_url)
+
+    return list(series_groups.values())
+
+
+def download_host(manga_urls, progress, manga_task):
+    """Download the series of a single host one after the other."""
+    for manga_url in manga_urls:
+        try:
+            download_series(manga_url, progress)
+        except Exception as e:
+            log.error("Unable to download %s", manga_url)
+            log.error(e)
+
+        progress.update(manga_task, advance=1)
 
 
 def download_manga():
     """Download manga's, manhua's or manhwa's."""
     with open(mangas, "r", encoding="utf-8") as f:
         manga_urls = [line.strip().rstrip("/") for line in f]
+    if poll_schedule is not None and not args.run:
+        manga_urls = poll_schedule.due(manga_urls)
+    page_cache.clear()
+    retry_policy.reset_stats()
+    if packager is not None:
+        packager.start()
+    if http_cache is not None:
+        http_cache.reset_stats()
     try:
         progress = Progress()
 
         with progress.progress:
             manga_task = progress.add_task(
-                "Downloading manga...", total=len(manga_urls)
+                "Downloading manga...", total=len(manga_urls), aggregate=True
             )
-
-            for manga_url in manga_urls:
-                manga = get_website_class(manga_url)
-                headers_image = manga.headers_image
-                headers_image.update({"referer": f"{manga_url}"})
-
-                chapters, title = manga.get_manga_chapters(manga_url)
-                chapter_task = progress.add_task(
-                    f"Downloading chapters for {title}", total=len(chapters)
-                )
-                genres, summary = manga.get_manga_metadata(manga_url)
-                sanitized_title = sanitize_title(title)
-
-                complete_dir = os.path.join(save_location, sanitized_title)
-                existing_chapters = (
-                    set(os.listdir(complete_dir))
-                    if os.path.exists(complete_dir)
-                    else set()
+            series_groups = group_by_host(manga_urls)
+
+            if engine == "asyncio":
+                asyncio.run(
+                    AsyncEngine(
+                        log,
+                        get_website_class,
+                        get_series_info,
+                        sanitize_title,
+                        save_location,
+                        num_threads,
+                        async_connections,
+                        series_threads,
+                        rate_limiter,
+                        state_store,
+                        stream_cbz,
+                        compression,
+                        packager,
+                        at_home_reporter,
+                        retry_policy,
+                        host_overrides,
+                        metrics,
+                        bandwidth_limiter,
+                    ).download_manga(series_groups, progress, manga_task)
                 )
-
-                if multi_threaded:
-                    with concurrent.futures.ThreadPoolExecutor(
-                        max_workers=num_threads
-                    ) as executor:
-                        futures = []
-                        for chapter_number, chapter_url in chapters:
-                            if f"Ch. {chapter_number}.cbz" in existing_chapters:
-                                log.info(
-                                    "%s Ch. %s already exists, skipping",
-                                    title,
-                                    chapter_number,
-                                )
-                                progress.update(chapter_task, advance=1)
-                                continue
-
-                            images = manga.get_chapter_images(chapter_url)
-                            futures.append(
-                                executor.submit(
-                                    ImageDownloader(
-                                        log, headers_image
-                                    ).download_chapter,
-                                    chapter_number,
-                                    images,
-                                    title,
-                                    sanitized_title,
-                                    save_location,
-                                    progress,
-                                    genres,
-                                    summary,
-                                    complete_dir,
-                                    chapter_task,
-                                )
-                            )
-
-                else:
-                    for chapter_number, chapter_url in chapters:
-                        if f"Ch. {chapter_number}.cbz" in existing_chapters:
-                            log.info(
-                                "%s Ch. %s already exists, skipping",
-                                title,
-                                chapter_number,
-                            )
-                            progress.update(chapter_task, advance=1)
-                            continue
-
-                        images = manga.get_chapter_images(chapter_url)
-                        ImageDownloader(log, headers_image).download_chapter(
-                            chapter_number,
-                            images,
-                            title,
-                            sanitized_title,
-                            save_location,
-                            progress,
-                            genres,
-                            summary,
-                            complete_dir,
-                            chapter_task,
-                        )
-
-            progress.update(manga_task, advance=1)
+            else:
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=series_threads
+                ) as executor:
+                    for host_urls in series_groups:
+                        executor.submit(download_host, host_urls, progress, manga_task)
+
+        driver_pool.close()
+        if packager is not None:
+            packager.close()
+        if at_home_reporter is not None:
+            at_home_reporter.flush()
+        driver_pool.log_stats()
+        session_pool.log_stats()
+        retry_policy.log_stats()
+        page_cache.log_stats()
+        if http_cache is not None:
+            http_cache.log_stats()
+        if args.run:
+            metrics.dump(metrics_file)
 
     except KeyboardInterrupt:
         progress.exit()
@@ -251,6 +533,11 @@ def calc_next_run(schd, write_out=False):
 def main():
     """Main function of the script"""
     try:
+        # Forked before the metrics server or any other thread starts.
+        if packager is not None:
+            packager.start()
+        if metrics_port:
+            metrics.serve(metrics_port, metrics_address)
         if args.run:
             log.warning("Run Mode: Script will exit after completion.")
             download_manga()
@@ -0,0 +1,711 @@
+"""asyncio download engine."""
+
+import asyncio
+import os
+import time
+
+import aiohttp
+
+from manga_dl.utilities.cbz_writer import CbzWriter
+from manga_dl.utilities.checkpoint import ChapterCheckpoint
+from manga_dl.utilities.file_handler import FileHandler
+from manga_dl.utilities.image_downloader import ImageDownloader
+from manga_dl.utilities.metrics import Metrics, site_of
+from manga_dl.utilities.session_pool import override_host
+from manga_dl.utilities.state_store import StateStore
+
+
+class AsyncSite:
+    """
+    An async variant of a site adapter.
+
+    The adapters fetch and parse pages with blocking calls, so every call is
+    run on the default executor while page_slots limits how many run at once.
+    Page fetches are a small fraction of the requests of a run, the images are
+    downloaded natively by AsyncImageDownloader.
+
+    Attributes:
+        site: The site adapter returned by get_website_class.
+        page_slots: An asyncio.Semaphore bounding concurrent page fetches.
+    """
+
+    def __init__(self, site, page_slots):
+        self.site = site
+        self.page_slots = page_slots
+        self.headers_image = site.headers_image
+
+    async def _call(self, method, *args):
+        async with self.page_slots:
+            return await asyncio.to_thread(method, *args)
+
+    async def get_manga_chapters(self, manga_url):
+        """Get the manga chapters for a given manga URL."""
+        return await self._call(self.site.get_manga_chapters, manga_url)
+
+    async def get_chapter_images(self, chapter_url):
+        """Get the manga chapter images for a given chapter URL."""
+        return await self._call(self.site.get_chapter_images, chapter_url)
+
+    async def get_manga_metadata(self, manga_url):
+        """Get the manga metadata for a given manga URL."""
+        return await self._call(self.site.get_manga_metadata, manga_url)
+
+    async def get_series_info(self, get_series_info, manga_url):
+        """Get the chapters, title and metadata with get_series_info."""
+        return await self._call(get_series_info, self.site, manga_url)
+
+
+class AsyncImageDownloader(ImageDownloader):
+    """
+    A class to download images with aiohttp.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        client: The aiohttp.ClientSession used for image requests.
+        image_slots: An asyncio.Semaphore bounding in-flight image requests.
+        rate_limiter: An optional RateLimiter pacing the requests per host.
+        stream_cbz: Write the images straight into the .cbz file instead of
+            a tmp directory that is zipped afterwards.
+        compression: The CompressionPolicy used for the .cbz files.
+        packager: An optional Packager packaging the chapters on its own
+            workers instead of the default executor.
+        reporter: An optional AtHomeReporter the MangaDex@Home downloads
+            are reported to.
+        image_failover: An optional AtHomeNodes moving the images of a
+            chapter to another node when theirs fails.
+        retry_policy: An optional RetryPolicy repeating failed images.
+        host_overrides: An optional dict of host to the base URL its
+            images are requested from instead.
+        metrics: The Metrics every image download and packaged chapter is
+            timed in, a private one if it is not given.
+        bandwidth_limiter: An optional BandwidthLimiter pacing the images
+            as they are read.
+        site: The host of the series, the site label of the packaging
+            metrics.
+    """
+
+    def __init__(
+        self,
+        logger,
+        headers,
+        client,
+        image_slots,
+        rate_limiter=None,
+        stream_cbz=False,
+        compression=None,
+        packager=None,
+        reporter=None,
+        image_failover=None,
+        retry_policy=None,
+        host_overrides=None,
+        metrics=None,
+        bandwidth_limiter=None,
+        site="",
+    ):
+        super().__init__(
+            logger,
+            headers,
+            session=None,
+            stream_cbz=stream_cbz,
+            compression=compression,
+            packager=packager,
+            reporter=reporter,
+            image_failover=image_failover,
+            bandwidth_limiter=bandwidth_limiter,
+            site=site,
+        )
+        self.client = client
+        self.image_slots = image_slots
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.host_overrides = host_overrides
+        self.metrics = metrics or Metrics(logger)
+
+    @staticmethod
+    def _write_file(path, data):
+        with open(path, "wb") as writer:
+            writer.write(data)
+
+    async def fetch_image(self, image, received=None):
+        """
+        Request an image, returning the status code, the body and the headers.
+
+        received is called with the size of every chunk of the body.
+        """
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(image)
+
+        async with self.client.get(
+            override_host(image, self.host_overrides), headers=self.headers_image
+        ) as result:
+            if self.rate_limiter is not None:
+                self.rate_limiter.update(image, result.status, result.headers)
+
+            if result.status != 200:
+                return result.status, None, result.headers
+
+            body = bytearray()
+            async for chunk in result.content.iter_chunked(65536):
+                body.extend(chunk)
+                if received is not None:
+                    received(len(chunk))
+                if self.bandwidth_limiter is not None:
+                    await self.bandwidth_limiter.throttle_async(image, len(chunk))
+            return result.status, bytes(body), result.headers
+
+    async def timed_image(self, download, chapter, image, *args):
+        """
+        Download a single image with download, timing it in the metrics.
+        """
+        with self.metrics.time("download_image", site_of(image)) as sample:
+            size = await download(chapter, image, *args)
+            sample["bytes"] = size or 0
+            sample["failed"] = not size
+            return size
+
+    async def download_image(self, chapter, image, path, progress, download_task):
+        """
+        Download a single image.
+        """
+        data = await self.get_image(
+            chapter, image, lambda size: progress.add_bytes(download_task, size)
+        )
+        progress.flush_bytes()
+        if data is None:
+            return False
+
+        await asyncio.to_thread(self._write_file, path, data)
+        progress.update(download_task, advance=1)
+        self.logger.info("Downloaded Ch. %s image: %s", chapter, os.path.basename(path))
+        return len(data)
+
+    async def stream_image(
+        self, chapter, image, writer, index, progress, download_task
+    ):
+        """
+        Download a single image into the .cbz file of its chapter.
+        """
+        data = await self.get_image(
+            chapter, image, lambda size: progress.add_bytes(download_task, size)
+        )
+        progress.flush_bytes()
+        if data is None:
+            return False
+
+        await asyncio.to_thread(
+            writer.add_page, index, self.get_image_name(image, index), data
+        )
+        progress.update(download_task, advance=1)
+        self.logger.info("Downloaded Ch. %s image: %s", chapter, image)
+        return len(data)
+
+    async def get_image(self, chapter, image, received=None):
+        """
+        Request an image under an image slot, returning its body or None.
+        received is called with the size of every chunk of the body.
+
+        The image is requested again on another MangaDex@Home node if its
+        node fails while image_failover can provide one, otherwise as the
+        retry policy allows.
+        """
+        attempts = self.retry_policy.start() if self.retry_policy else None
+        while True:
+            if self.image_failover is not None:
+                image = self.image_failover.current(image)
+
+            try:
+                start_time = time.time()
+                async with self.image_slots:
+                    status, data, headers = await self.fetch_image(image, received)
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if await self.fail_over(image):
+                    continue
+
+                delay = attempts.delay(error=e) if attempts else None
+                if delay is not None:
+                    self.logger.warning("Retrying %s in %.1fs: %s", image, delay, e)
+                    await asyncio.sleep(delay)
+                    continue
+
+                self.logger.error(
+                    "Unable to download page %s from chapter %s", image, chapter
+                )
+                self.logger.error(e)
+                return None
+
+            duration = time.time() - start_time
+            if self.reporter is not None:
+                self.reporter.report(
+                    image,
+                    data is not None,
+                    headers.get("X-Cache", "").startswith("HIT"),
+                    len(data) if data is not None else 0,
+                    duration * 1000,
+                )
+
+            if data is not None:
+                if self.image_failover is not None:
+                    await asyncio.to_thread(
+                        self.image_failover.observe, image, len(data), duration
+                    )
+                return data
+
+            if await self.fail_over(image):
+                continue
+
+            delay = attempts.delay(status=status) if attempts else None
+            if delay is not None:
+                self.logger.warning(
+                    "Retrying %s in %.1fs: returned %s", image, delay, status
+                )
+                # The rate limiter already holds the host back.
+                if status != 429 or self.rate_limiter is None:
+                    await asyncio.sleep(delay)
+                continue
+
+            self.logger.error(
+                "Unable to download page %s from chapter %s, "
+                "request returned error %s",
+                image,
+                chapter,
+                status,
+            )
+            return None
+
+    async def fail_over(self, image):
+        """Move the chapter of a failed image to another MangaDex@Home node."""
+        if self.image_failover is None:
+            return False
+
+        return await asyncio.to_thread(self.image_failover.failed, image)
+
+    async def download_images(
+        self,
+        images,
+        title_id,
+        sanitized_title_id,
+        chapter,
+        save_location,
+        progress,
+        download_task,
+    ):
+        """
+        Download images for a given manga chapter.
+        """
+        complete_dir = os.path.join(save_location, sanitized_title_id)
+        os.makedirs(complete_dir, exist_ok=True)
+
+        tmp_path = self.chapter_tmp_path(save_location, sanitized_title_id, chapter)
+        os.makedirs(tmp_path, exist_ok=True)
+
+        names = [
+            self.get_image_name(image_url, i) for i, image_url in enumerate(images)
+        ]
+        checkpoint = ChapterCheckpoint(self.logger, tmp_path)
+        await asyncio.to_thread(checkpoint.start, names, images)
+
+        pending = []
+        for image_url, name in zip(images, names):
+            if checkpoint.is_complete(name):
+                progress.update(download_task, advance=1)
+            else:
+                pending.append((image_url, name))
+
+        if len(pending) < len(images):
+            self.logger.info(
+                "Resuming %s Ch. %s, %s of %s pages already downloaded",
+                sanitized_title_id,
+                chapter,
+                len(images) - len(pending),
+                len(images),
+            )
+        else:
+            self.logger.info("Downloading %s Ch. %s", sanitized_title_id, chapter)
+
+        async def download(image_url, name):
+            size = await self.timed_image(
+                self.download_image,
+                chapter,
+                image_url,
+                os.path.join(tmp_path, name),
+                progress,
+                download_task,
+            )
+            if size:
+                await asyncio.to_thread(checkpoint.complete, name)
+            return size
+
+        results = await asyncio.gather(
+            *(download(image_url, name) for image_url, name in pending)
+        )
+
+        completed = all(results)
+        if not completed:
+            await asyncio.to_thread(checkpoint.failed)
+            self.logger.error("Incomplete download of %s Ch. %s", title_id, chapter)
+
+        return completed
+
+    async def stream_chapter(
+        self,
+        images,
+        title_id,
+        chapter,
+        genres,
+        summary,
+        complete_dir,
+        progress,
+        download_task,
+    ):
+        """
+        Download the images of a chapter straight into its .cbz file.
+        """
+        os.makedirs(complete_dir, exist_ok=True)
+        writer = CbzWriter(
+            self.logger,
+            os.path.join(complete_dir, f"Ch. {chapter}.cbz"),
+            len(images),
+            compression=self.compression,
+        )
+
+        self.logger.info("Downloading %s Ch. %s", title_id, chapter)
+
+        try:
+            results = await asyncio.gather(
+                *(
+                    self.timed_image(
+                        self.stream_image,
+                        chapter,
+                        image_url,
+                        writer,
+                        i,
+                        progress,
+                        download_task,
+                    )
+                    for i, image_url in enumerate(images)
+                )
+            )
+        except BaseException:
+            await asyncio.to_thread(writer.abort)
+            raise
+
+        if not all(results):
+            await asyncio.to_thread(writer.abort)
+            self.logger.error("Incomplete download of %s Ch. %s", title_id, chapter)
+            return False
+
+        return await asyncio.to_thread(
+            writer.finish,
+            FileHandler(self.logger).comic_info(title_id, genres, summary),
+        )
+
+    async def download_chapter(
+        self,
+        x,
+        images,
+        title_id,
+        sanitized_title_id,
+        save_location,
+        progress,
+        genres,
+        summary,
+        complete_dir,
+        chapter_task,
+    ):
+        """Download a chapter and return True if it was packaged."""
+        download_task = progress.add_task(
+            f"[cyan]Downloading Ch. {x}", total=len(images)
+        )
+        if self.stream_cbz:
+            completed = await self.stream_chapter(
+                images,
+                title_id,
+                x,
+                genres,
+                summary,
+                complete_dir,
+                progress,
+                download_task,
+            )
+            if completed:
+                self.logger.info("done zipping: Ch. %s", x)
+
+        else:
+            completed = await self.download_images(
+                images,
+                title_id,
+                sanitized_title_id,
+                chapter=x,
+                save_location=save_location,
+                progress=progress,
+                download_task=download_task,
+            )
+            if completed and self.packager is not None:
+                await asyncio.wrap_future(
+                    self.packager.submit(
+                        x,
+                        title_id,
+                        sanitized_title_id,
+                        save_location,
+                        genres,
+                        summary,
+                        complete_dir,
+                        self.site,
+                    )
+                )
+            elif completed:
+                await asyncio.to_thread(
+                    self.package_chapter,
+                    x,
+                    title_id,
+                    sanitized_title_id,
+                    save_location,
+                    genres,
+                    summary,
+                    complete_dir,
+                )
+
+        if completed:
+            progress.remove_task(download_task)
+            progress.update(chapter_task, advance=1)
+
+        return completed
+
+
+class AsyncEngine:
+    """
+    Download manga with asyncio instead of a thread per chapter.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        get_website_class: A callable returning the site adapter for a URL.
+        get_series_info: A callable returning the chapters, title, genres and
+            summary of a series from its adapter and URL.
+        sanitize_title: A callable making a title safe for file paths.
+        save_location: The directory the manga are saved to.
+        num_chapters: The number of chapters of a series downloaded at once.
+        connections: The number of image requests in flight at once.
+        series_threads: The number of hosts whose series are downloaded at once.
+        rate_limiter: An optional RateLimiter pacing the requests per host.
+        state_store: The StateStore recording the downloaded chapters,
+            an in-memory one is used if it is not given.
+        stream_cbz: Write the images straight into the .cbz files.
+        compression: The CompressionPolicy used for the .cbz files.
+        packager: An optional Packager packaging the chapters.
+        reporter: An optional AtHomeReporter for MangaDex@Home downloads.
+        retry_policy: An optional RetryPolicy repeating failed images.
+        host_overrides: An optional dict of host to the base URL its
+            images are requested from instead.
+        metrics: An optional Metrics the downloads are timed in.
+        bandwidth_limiter: An optional BandwidthLimiter pacing the images.
+    """
+
+    def __init__(
+        self,
+        logger,
+        get_website_class,
+        get_series_info,
+        sanitize_title,
+        save_location,
+        num_chapters,
+        connections,
+        series_threads=1,
+        rate_limiter=None,
+        state_store=None,
+        stream_cbz=False,
+        compression=None,
+        packager=None,
+        reporter=None,
+        retry_policy=None,
+        host_overrides=None,
+        metrics=None,
+        bandwidth_limiter=None,
+    ):
+        self.logger = logger
+        self.get_website_class = get_website_class
+        self.get_series_info = get_series_info
+        self.sanitize_title = sanitize_title
+        self.save_location = save_location
+        self.num_chapters = num_chapters
+        self.connections = connections
+        self.series_threads = series_threads
+        self.rate_limiter = rate_limiter
+        self.state_store = state_store or StateStore(logger, ":memory:")
+        self.stream_cbz = stream_cbz
+        self.compression = compression
+        self.packager = packager
+        self.reporter = reporter
+        self.retry_policy = retry_policy
+        self.host_overrides = host_overrides
+        self.metrics = metrics or Metrics(logger)
+        self.bandwidth_limiter = bandwidth_limiter
+
+    async def download_manga(self, series_groups, progress, manga_task):
+        """
+        Download every series.
+
+        series_groups is a list of series URL lists, one per host. The series
+        of a host are downloaded one after the other while up to
+        series_threads hosts are downloaded at once.
+        """
+        page_slots = asyncio.Semaphore(self.num_chapters)
+        series_slots = asyncio.Semaphore(self.series_threads)
+        image_slots = asyncio.Semaphore(self.connections)
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=30)
+
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as client:
+
+            async def download_group(manga_urls):
+                async with series_slots:
+                    for manga_url in manga_urls:
+                        try:
+                            await self.download_series(
+                                manga_url, progress, client, page_slots, image_slots
+                            )
+                        except Exception as e:
+                            self.logger.error("Unable to download %s", manga_url)
+                            self.logger.error(e)
+
+                        progress.update(manga_task, advance=1)
+
+            await asyncio.gather(
+                *(download_group(manga_urls) for manga_urls in series_groups)
+            )
+
+    async def download_series(
+        self, manga_url, progress, client, page_slots, image_slots
+    ):
+        """Download the missing chapters of a single series."""
+        chapter_slots = asyncio.Semaphore(self.num_chapters)
+        site = AsyncSite(self.get_website_class(manga_url), page_slots)
+        headers_image = {**site.headers_image, "referer": manga_url}
+
+        chapters, title, genres, summary = await site.get_series_info(
+            self.get_series_info, manga_url
+        )
+        chapter_task = progress.add_task(
+            f"Downloading chapters for {title}", total=len(chapters)
+        )
+        sanitized_title = self.sanitize_title(title)
+
+        complete_dir = os.path.join(self.save_location, sanitized_title)
+        await asyncio.to_thread(
+            self.state_store.register_series,
+            manga_url,
+            title,
+            type(site.site).__name__,
+            complete_dir,
+            len(chapters),
+        )
+        await asyncio.to_thread(
+            self.state_store.record_releases,
+            manga_url,
+            [number for number, _ in chapters],
+            getattr(site.site, "release_dates", None),
+        )
+        downloaded_chapters = await asyncio.to_thread(
+            self.state_store.downloaded_chapters, manga_url
+        )
+        downloader = AsyncImageDownloader(
+            self.logger,
+            headers_image,
+            client,
+            image_slots,
+            self.rate_limiter,
+            self.stream_cbz,
+            self.compression,
+            self.packager,
+            self.reporter,
+            getattr(site.site, "image_failover", None),
+            self.retry_policy,
+            self.host_overrides,
+            self.metrics,
+            self.bandwidth_limiter,
+            site_of(manga_url),
+        )
+
+        images_max_age = getattr(
+            site.site, "images_max_age", ChapterCheckpoint.images_max_age
+        )
+
+        async def download_chapter(chapter_number, chapter_url):
+            async with chapter_slots:
+                images = await asyncio.to_thread(
+                    downloader.resumable_images,
+                    self.save_location,
+                    sanitized_title,
+                    chapter_number,
+                    images_max_age,
+                )
+                if not images:
+                    with self.metrics.time(
+                        "chapter_images", site_of(manga_url)
+                    ) as sample:
+                        images = await site.get_chapter_images(chapter_url)
+                        sample["failed"] = not images
+                if not images:
+                    self.logger.error("No images found for Ch. %s", chapter_number)
+                    await asyncio.to_thread(
+                        self.state_store.mark_failed,
+                        manga_url,
+                        chapter_number,
+                        chapter_url,
+                        "no images found",
+                    )
+                    return
+
+                completed = await downloader.download_chapter(
+                    chapter_number,
+                    images,
+                    title,
+                    sanitized_title,
+                    self.save_location,
+                    progress,
+                    genres,
+                    summary,
+                    complete_dir,
+                    chapter_task,
+                )
+                await asyncio.to_thread(
+                    self.state_store.record_chapter,
+                    manga_url,
+                    chapter_number,
+                    chapter_url,
+                    images,
+                    os.path.join(complete_dir, f"Ch. {chapter_number}.cbz"),
+                    completed,
+                )
+
+        async def download(chapter_number, chapter_url):
+            try:
+                await download_chapter(chapter_number, chapter_url)
+            except Exception as e:
+                await asyncio.to_thread(
+                    self.state_store.mark_failed,
+                    manga_url,
+                    chapter_number,
+                    chapter_url,
+                    str(e),
+                )
+                raise
+
+        downloads = []
+        for chapter_number, chapter_url in chapters:
+            if str(chapter_number) in downloaded_chapters:
+                self.logger.info(
+                    "%s Ch. %s already exists, skipping", title, chapter_number
+                )
+                progress.update(chapter_task, advance=1)
+                continue
+
+            downloads.append(download(chapter_number, chapter_url))
+
+        results = await asyncio.gather(*downloads, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.logger.error("Chapter download of %s failed", title)
+                self.logger.error(result)
@@ -0,0 +1,107 @@
+"""Track and replace the MangaDex@Home nodes serving each chapter."""
+
+import re
+import threading
+
+AT_HOME_IMAGE = re.compile(
+    r"^(?P<base>.+?)/(?P<mode>data|data-saver)/(?P<hash>[^/]+)/(?P<file>[^/]+)$"
+)
+
+
+class AtHomeNodes:
+    """
+    The MangaDex@Home node currently serving each chapter.
+
+    When a node answers an image with an error, or sends it slower than
+    min_speed, a new node is requested for the chapter and the remaining
+    images of the chapter are downloaded from it. A chapter gets at most
+    max_refreshes new nodes per run.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        get_node_url: A callable returning a new node base URL for a chapter id.
+        min_speed: The minimum speed in KB/s of an image that took over a
+            second, 0 to not check the speed.
+    """
+
+    max_refreshes = 3
+
+    def __init__(self, logger, get_node_url, min_speed=0):
+        self.logger = logger
+        self.get_node_url = get_node_url
+        self.min_speed = min_speed
+        self._chapters = {}
+        self._lock = threading.Lock()
+
+    def register(self, chapter_id, base_url, chapter_hash):
+        """Record the node serving a chapter."""
+        with self._lock:
+            self._chapters[chapter_hash] = {
+                "id": chapter_id,
+                "base": base_url,
+                "refreshes": 0,
+                "lock": threading.Lock(),
+            }
+
+    def current(self, url):
+        """Return url on the node currently serving its chapter."""
+        match = AT_HOME_IMAGE.match(url)
+        if match is None:
+            return url
+
+        with self._lock:
+            chapter = self._chapters.get(match.group("hash"))
+            if chapter is None or chapter["base"] == match.group("base"):
+                return url
+
+            return f"{chapter['base']}{url[match.end('base'):]}"
+
+    def failed(self, url):
+        """
+        Replace the node of url after it failed.
+
+        Returns True if the image can be requested again on another node.
+        """
+        match = AT_HOME_IMAGE.match(url)
+        if match is None:
+            return False
+
+        with self._lock:
+            chapter = self._chapters.get(match.group("hash"))
+        if chapter is None:
+            return False
+
+        with chapter["lock"]:
+            # Another thread already moved the chapter to a new node.
+            if chapter["base"] != match.group("base"):
+                return True
+
+            if chapter["refreshes"] >= self.max_refreshes:
+                return False
+
+            chapter["refreshes"] += 1
+            self.logger.warning(
+                "MangaDex@Home node %s failed, requesting a new one",
+                match.group("base"),
+            )
+            try:
+                base_url = self.get_node_url(chapter["id"])
+            except Exception as e:
+                self.logger.error(e)
+                return False
+
+            if not base_url:
+                return False
+
+            with self._lock:
+                chapter["base"] = base_url
+            return True
+
+    def observe(self, url, size, duration):
+        """Replace the node of url if it sent size bytes too slowly."""
+        if not self.min_speed or duration < 1:
+            return
+
+        if size / 1024 / duration < self.min_speed:
+            self.logger.info("%s was sent at %.0f KB/s", url, size / 1024 / duration)
+            self.failed(url)
@@ -0,0 +1,155 @@
+"""Background reporting of MangaDex@Home image downloads."""
+
+import queue
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+_STOP = object()
+
+
+class AtHomeReporter:
+    """
+    Send MangaDex@Home download reports from a background thread.
+
+    MangaDex asks clients to report every image downloaded from an @Home
+    node. The download threads only queue a small record per image and a
+    single background thread posts the records one by one over the pooled
+    connection, so no page waits for a report. The thread takes up to
+    drain_size records off the queue at a time to free room for new ones.
+    At most max_pending records are kept, newer ones are dropped while the
+    queue is full.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        session: The SessionPool used to send the reports.
+        max_pending: The maximum number of records waiting to be sent.
+        drain_size: The maximum number of records taken off the queue at once,
+            each of them is still sent in its own request.
+    """
+
+    report_url = "https://api.mangadex.network/report"
+
+    def __init__(self, logger, session, max_pending=1000, drain_size=50):
+        self.logger = logger
+        self.session = session
+        self.max_pending = max_pending
+        self.drain_size = drain_size
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_at_home(url):
+        """Return True if url is an image served by a MangaDex@Home node."""
+        parsed = urlparse(url)
+        if parsed.hostname is None or parsed.hostname.endswith("mangadex.org"):
+            return False
+
+        return re.search(r"/data(-saver)?/[^/]+/[^/]+$", parsed.path) is not None
+
+    def report(self, url, success, cached, size, duration):
+        """
+        Queue the report of an image download.
+
+        Args:
+            url: The image URL.
+            success: Whether the image was downloaded.
+            cached: Whether the node served the image from its cache.
+            size: The number of bytes received.
+            duration: The download time in milliseconds.
+        """
+        if not self.is_at_home(url):
+            return
+
+        self._start()
+        try:
+            self._queue.put_nowait(
+                {
+                    "url": url,
+                    "success": success,
+                    "cached": cached,
+                    "bytes": size,
+                    "duration": int(duration),
+                }
+            )
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="at-home-reporter", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            while len(records) < self.drain_size:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Records queued after a stop were taken off the queue too, send
+            # them before returning so none is lost.
+            stop = False
+            for record in records:
+                if record is _STOP:
+                    stop = True
+                else:
+                    self._send(record)
+            if stop:
+                return
+
+    def _send(self, record):
+        try:
+            response = self.session.post(
+                self.report_url, json=record, stage="report", timeout=30
+            )
+            ok = response.status_code == 200
+            response.close()
+        except Exception as e:
+            self.logger.debug(e)
+            ok = False
+
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def flush(self, timeout=30):
+        """Send the queued reports, waiting at most timeout seconds."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+
+        if thread is None:
+            return
+
+        deadline = time.monotonic() + timeout
+        while thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=0.1)
+                break
+            except queue.Full:
+                if time.monotonic() > deadline:
+                    break
+        thread.join(max(deadline - time.monotonic(), 0))
+
+        with self._lock:
+            self.logger.info(
+                "MangaDex@Home reports: %s sent, %s failed, %s dropped",
+                self.sent,
+                self.failed,
+                self.dropped,
+            )
+            self.sent = self.failed = self.dropped = 0
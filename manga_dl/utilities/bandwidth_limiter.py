@@ -0,0 +1,127 @@
+"""Global and per-host download bandwidth limiting."""
+
+import asyncio
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+from manga_dl.utilities.rate_limiter import TokenBucket
+
+
+class BandwidthLimiter:
+    """
+    A thread-safe and asyncio-safe cap on the bytes downloaded per second.
+
+    The total limit applies to every download together and a domain limit
+    to the downloads from the domain and its subdomains. Every chunk read
+    is paid for in a token bucket holding a second of the limit, the reading
+    thread waits while the bucket is empty, so the number of downloads in
+    flight stays the same while each of them slows down. A profile replaces
+    the limits it lists from its start time until its end time of every
+    day, the first matching profile wins.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        limits: A dict of total or a domain to KB per second, 0 for no limit.
+        profiles: A dict of a daily HH:MM-HH:MM window to the limits
+            replaced during it.
+    """
+
+    # How often in seconds the active profile is looked up.
+    profile_interval = 10
+
+    def __init__(self, logger, limits=None, profiles=None):
+        self.logger = logger
+        self.limits = dict(limits or {})
+        self.profiles = [
+            (window, *self._parse_window(window), {**self.limits, **window_limits})
+            for window, window_limits in (profiles or {}).items()
+        ]
+        self._active = None
+        self._buckets = {}
+        self._checked = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse_window(window):
+        try:
+            start, end = (
+                datetime.strptime(part.strip(), "%H:%M").time()
+                for part in window.split("-")
+            )
+        except ValueError:
+            raise ValueError(f"Invalid bandwidth profile window: {window}") from None
+
+        return start, end
+
+    def _profile(self, now):
+        """Return the window and limits of the profile active at now."""
+        current = now.time()
+        for window, start, end, limits in self.profiles:
+            if start <= end:
+                inside = start <= current < end
+            else:
+                # The window runs over midnight.
+                inside = current >= start or current < end
+            if inside:
+                return window, limits
+
+        return None, self.limits
+
+    def _refresh(self, now):
+        first = self._checked is None
+        if not first and now - self._checked < self.profile_interval:
+            return
+
+        self._checked = now
+        window, limits = self._profile(datetime.now())
+        if not first and window == self._active:
+            return
+
+        self._active = window
+        self._buckets = {
+            domain: TokenBucket(float(rate) * 1024, float(rate) * 1024)
+            for domain, rate in limits.items()
+            if float(rate) > 0
+        }
+        self.logger.info(
+            "Bandwidth limits%s: %s",
+            f" of {window}" if window else "",
+            ", ".join(f"{domain} {rate} KB/s" for domain, rate in limits.items())
+            or "none",
+        )
+
+    def _domain(self, host):
+        for domain in self._buckets:
+            if domain != "total" and (host == domain or host.endswith(f".{domain}")):
+                return domain
+
+        return None
+
+    def _reserve(self, url, size):
+        if not self.limits and not self.profiles:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            wait = 0.0
+            for domain in ("total", self._domain(urlparse(url).hostname or "")):
+                bucket = self._buckets.get(domain)
+                if bucket is not None:
+                    wait = max(wait, bucket.reserve(now, size))
+
+            return wait
+
+    def throttle(self, url, size):
+        """Block the calling thread until size bytes of url may be read."""
+        wait = self._reserve(url, size)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def throttle_async(self, url, size):
+        """Wait without blocking the event loop until size bytes may be read."""
+        wait = self._reserve(url, size)
+        if wait > 0:
+            await asyncio.sleep(wait)
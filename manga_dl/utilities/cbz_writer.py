@@ -0,0 +1,131 @@
+"""Write downloaded pages straight into a .cbz archive."""
+
+import os
+import tempfile
+import threading
+import zipfile
+
+from manga_dl.utilities.compression import CompressionPolicy
+
+
+class CbzWriter:
+    """
+    A thread-safe writer adding pages to a .cbz file in page order.
+
+    Pages can be added from several threads in any order. Each page is
+    written to the archive as soon as every page before it is written, the
+    pages that arrive early wait in memory, or in a temporary file once more
+    than buffer_bytes are waiting. The archive is written to a .part file
+    that is renamed once every page and the ComicInfo.xml are in it.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        output_path: The path of the finished .cbz file.
+        page_count: The number of pages of the chapter.
+        buffer_bytes: The size of the early pages kept in memory.
+        compression: The CompressionPolicy choosing how each page and the
+            ComicInfo.xml are compressed.
+    """
+
+    def __init__(
+        self,
+        logger,
+        output_path,
+        page_count,
+        buffer_bytes=32 * 1024**2,
+        compression=None,
+    ):
+        self.logger = logger
+        self.output_path = output_path
+        self.page_count = page_count
+        self.buffer_bytes = buffer_bytes
+        self.compression = compression or CompressionPolicy()
+        self.part_path = f"{output_path}.part"
+        self._zip = zipfile.ZipFile(self.part_path, "w", zipfile.ZIP_DEFLATED)
+        self._pending = {}
+        self._buffered = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def add_page(self, index, name, data):
+        """Add the page at index, stored in the archive under name."""
+        with self._lock:
+            if index != self._next:
+                self._hold(index, name, data)
+                return
+
+            self._write(name, data)
+            while self._next in self._pending:
+                name, data = self._pending.pop(self._next)
+                self._write(name, self._release(data))
+
+    def _hold(self, index, name, data):
+        if self._buffered + len(data) > self.buffer_bytes:
+            spooled = tempfile.TemporaryFile()
+            spooled.write(data)
+            data = spooled
+        else:
+            self._buffered += len(data)
+
+        self._pending[index] = (name, data)
+
+    def _release(self, data):
+        if isinstance(data, bytes):
+            self._buffered -= len(data)
+            return data
+
+        with data:
+            data.seek(0)
+            return data.read()
+
+    def _writestr(self, name, data):
+        compress_type, compresslevel = self.compression.compression(data[:16])
+        self._zip.writestr(
+            name, data, compress_type=compress_type, compresslevel=compresslevel
+        )
+
+    def _write(self, name, data):
+        self._writestr(name, data)
+        self._next += 1
+        self.logger.info("%s added to %s", name, self.output_path)
+
+    def finish(self, comic_info):
+        """
+        Add the ComicInfo.xml and move the archive to output_path.
+
+        Returns False and removes the archive if pages are missing.
+        """
+        with self._lock:
+            if self._next != self.page_count:
+                self.logger.error(
+                    "Only %s of %s pages written to %s",
+                    self._next,
+                    self.page_count,
+                    self.output_path,
+                )
+                self._close()
+                return False
+
+            self._writestr("ComicInfo.xml", comic_info)
+            self._zip.close()
+            os.replace(self.part_path, self.output_path)
+
+        self.logger.info("ComicInfo.xml added to %s", self.output_path)
+        return True
+
+    def abort(self):
+        """Remove the unfinished archive."""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        self._zip.close()
+        for _, data in self._pending.values():
+            if not isinstance(data, bytes):
+                data.close()
+        self._pending.clear()
+        self._buffered = 0
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
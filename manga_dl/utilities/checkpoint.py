@@ -0,0 +1,148 @@
+"""On-disk progress of a chapter being downloaded."""
+
+import json
+import os
+import threading
+import time
+
+
+class ChapterCheckpoint:
+    """
+    The pages of a chapter that are downloaded and verified.
+
+    The checkpoint is kept in the tmp directory of the chapter next to its
+    pages, together with the names of all of its pages and the image URLs
+    they came from. A rerun after a failed or interrupted download only
+    fetches the pages that are missing or whose size on disk no longer
+    matches, and can reuse the image URLs instead of resolving them again.
+    A page cut off halfway keeps the ETag or Last-Modified of its response,
+    the validator its rest is requested with.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        directory: The tmp directory of the chapter.
+    """
+
+    file_name = ".checkpoint.json"
+
+    # How long image URLs are reused, unless the website sets images_max_age.
+    images_max_age = 24 * 3600
+
+    def __init__(self, logger, directory):
+        self.logger = logger
+        self.directory = directory
+        self.path = os.path.join(directory, self.file_name)
+        self.names = None
+        self.pages = {}
+        self.validators = {}
+        self.images = None
+        self.resolved_at = None
+        self.reused = False
+        self._lock = threading.Lock()
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as reader:
+                data = json.load(reader)
+            self.names = data["names"]
+            self.pages = data["pages"]
+            self.validators = data.get("validators", {})
+            self.images = data.get("images")
+            self.resolved_at = data.get("resolved_at")
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def resumable_images(self, max_age):
+        """
+        Return the image URLs of an unfinished download resolved at most
+        max_age seconds ago, or None if they have to be resolved again.
+        """
+        if not self.images or self.resolved_at is None:
+            return None
+        if time.time() - self.resolved_at >= max_age:
+            return None
+
+        return self.images
+
+    def start(self, names, images=None):
+        """
+        Start or resume downloading the pages called names from images.
+
+        Pages left over from a different image list, or from a download
+        without a checkpoint, are removed.
+        """
+        with self._lock:
+            self.reused = images is not None and images == self.images
+            if self.names != names:
+                if os.listdir(self.directory):
+                    self.logger.info("Discarding old pages in %s", self.directory)
+                for name in os.listdir(self.directory):
+                    os.remove(os.path.join(self.directory, name))
+                self.names = names
+                self.pages = {}
+                self.validators = {}
+            if images is not None and not self.reused:
+                self.images = images
+                self.resolved_at = time.time()
+            self._save()
+
+    def failed(self):
+        """
+        Forget reused image URLs after a failed download, they may have
+        expired, so the next attempt resolves them again.
+        """
+        with self._lock:
+            if self.reused:
+                self.images = None
+                self.resolved_at = None
+                self._save()
+
+    def validator(self, name):
+        """Return the validator of the partial page called name, if any."""
+        with self._lock:
+            return self.validators.get(name)
+
+    def partial(self, name, validator):
+        """Record the validator of the partial page called name, or None."""
+        with self._lock:
+            if self.validators.get(name) == validator:
+                return
+            if validator is None:
+                del self.validators[name]
+            else:
+                self.validators[name] = validator
+            self._save()
+
+    def is_complete(self, name):
+        """Return True if the page called name is downloaded and intact."""
+        with self._lock:
+            size = self.pages.get(name)
+
+        try:
+            return size is not None and (
+                os.path.getsize(os.path.join(self.directory, name)) == size
+            )
+        except OSError:
+            return False
+
+    def complete(self, name):
+        """Record that the page called name is downloaded."""
+        size = os.path.getsize(os.path.join(self.directory, name))
+        with self._lock:
+            self.pages[name] = size
+            self.validators.pop(name, None)
+            self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as writer:
+            json.dump(
+                {
+                    "names": self.names,
+                    "pages": self.pages,
+                    "validators": self.validators,
+                    "images": self.images,
+                    "resolved_at": self.resolved_at,
+                },
+                writer,
+            )
+        os.replace(tmp_path, self.path)
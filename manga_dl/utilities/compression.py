@@ -0,0 +1,51 @@
+"""Choose how each entry of a .cbz file is compressed."""
+
+import zipfile
+
+# Magic bytes of image formats that are already compressed.
+COMPRESSED_SIGNATURES = (
+    b"\xff\xd8\xff",  # JPEG
+    b"\x89PNG\r\n\x1a\n",  # PNG
+    b"GIF87a",
+    b"GIF89a",
+)
+
+
+class CompressionPolicy:
+    """
+    Store already compressed images and deflate everything else.
+
+    JPEG, PNG, GIF, WebP and AVIF pages barely shrink when they are deflated
+    again, so they are stored as they are. Text such as the ComicInfo.xml
+    and uncompressed images such as BMP are deflated with compression_level.
+
+    Attributes:
+        compression_level: The deflate level from 0 to 9.
+    """
+
+    def __init__(self, compression_level=6):
+        self.compression_level = compression_level
+
+    @staticmethod
+    def is_compressed(header):
+        """Return True if header starts an already compressed image."""
+        if header.startswith(COMPRESSED_SIGNATURES):
+            return True
+
+        # WebP is a RIFF container, AVIF an ISO media file.
+        if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+            return True
+
+        return header[4:12] in (b"ftypavif", b"ftypavis")
+
+    def compression(self, header):
+        """
+        Return the zipfile compress_type and compresslevel for an entry.
+
+        Args:
+            header: At least the first 12 bytes of the entry.
+        """
+        if self.is_compressed(header):
+            return zipfile.ZIP_STORED, None
+
+        return zipfile.ZIP_DEFLATED, self.compression_level
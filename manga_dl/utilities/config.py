@@ -16,26 +16,78 @@ class ConfigHandler:
         # Read existing config file.
         self.config.read(path)
 
-    def get(self, section, option):
-        return self.config.get(section, option)
+    def get(self, section, option, **kwargs):
+        return self.config.get(section, option, **kwargs)
 
-    def getint(self, section, option):
-        return self.config.getint(section, option)
+    def getint(self, section, option, **kwargs):
+        return self.config.getint(section, option, **kwargs)
 
-    def getboolean(self, section, option):
-        return self.config.getboolean(section, option)
+    def getboolean(self, section, option, **kwargs):
+        return self.config.getboolean(section, option, **kwargs)
 
     def has_option(self, section, option):
         return self.config.has_option(section, option)
 
+    def sections(self):
+        return self.config.sections()
+
+    def items(self, section):
+        if not self.config.has_section(section):
+            return {}
+        return dict(self.config.items(section))
+
     def _generate_default_config(self):
         self.config["General"] = {
             "mangas": "./data/manga.txt",
             "multi_threaded": "True",
             "num_threads": "10",
+            "image_threads": "4",
+            "resolver_threads": "4",
+            "series_threads": "1",
+            "stream_cbz": "False",
+            "compression_level": "6",
+            "packaging_workers": "2",
+            "packaging_mode": "thread",
+            "selenium_drivers": "2",
+            "selenium_max_pages": "50",
+            "mangadex_reports": "True",
+            "mangadex_data_saver": "False",
+            "mangadex_min_speed": "50",
+            "engine": "threads",
+            "async_connections": "100",
+            "http_cache": "True",
+            "http_cache_size": "200",
+            "metrics_port": "0",
+            "metrics_address": "127.0.0.1",
+            "metrics_file": "metrics.json",
             "save_location": "./data/manga",
             "schedule": "720",
         }
+        self.config["RateLimits"] = {
+            "api.mangadex.org": "4",
+        }
+        self.config["Retries"] = {
+            "network": "3",
+            "408": "3",
+            "429": "5",
+            "5xx": "3",
+            "backoff": "1",
+            "max_backoff": "30",
+            "budget": "120",
+        }
+        self.config["HostOverrides"] = {}
+        self.config["Bandwidth"] = {
+            "total": "0",
+        }
+        self.config["Polling"] = {
+            "adaptive": "True",
+            "dormant_days": "60",
+            "dormant_hours": "168",
+            "completed_days": "365",
+            "completed_hours": "720",
+            "unknown_hours": "24",
+        }
+        self.config["SeriesPolling"] = {}
 
         with open(self.path, "w") as configfile:
             self.config.write(configfile)
@@ -0,0 +1,141 @@
+"""A pool of long-lived headless Chrome drivers."""
+
+import contextlib
+import os
+import queue
+import threading
+from collections import Counter
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+
+class DriverPool:
+    """
+    A thread-safe pool of headless Chrome drivers reused across chapters.
+
+    Drivers are started on first use, up to size at once, and callers wait
+    for a free one after that. A driver is replaced after max_pages pages
+    to keep Chrome's memory in check, and right away if it crashes. Every
+    driver gets its own profile directory since Chrome locks it. The pool
+    also counts the chapters whose images were read from the HTML or with
+    Chrome, so a run can report how often Chrome was needed.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        size: The maximum number of drivers running at once.
+        max_pages: The number of pages a driver loads before it is replaced.
+        profile_dir: The directory holding the driver profiles.
+    """
+
+    def __init__(
+        self,
+        logger,
+        size=2,
+        max_pages=50,
+        profile_dir=os.path.join("/config", ".cache", "selenium"),
+    ):
+        self.logger = logger
+        self.size = size
+        self.max_pages = max_pages
+        self.profile_dir = profile_dir
+        self.started = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._free_profiles = list(range(size))
+        self._lock = threading.Lock()
+        self.image_paths = Counter()
+
+    def _create_driver(self, profile):
+        options = webdriver.ChromeOptions()
+        options.add_argument("headless")
+        options.add_argument("no-sandbox")
+        options.add_argument("disable-dev-shm-usage")
+        options.add_argument(
+            f"user-data-dir={os.path.join(self.profile_dir, str(profile))}"
+        )
+        return webdriver.Chrome(options=options)
+
+    @contextlib.contextmanager
+    def driver(self):
+        """Yield a driver for loading a single page."""
+        with self._slots:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    profile = self._free_profiles.pop()
+                    self.started += 1
+                try:
+                    entry = {
+                        "driver": self._create_driver(profile),
+                        "profile": profile,
+                        "pages": 0,
+                    }
+                except BaseException:
+                    self._release_profile(profile)
+                    raise
+                self.logger.debug("Started Chrome driver %s", profile)
+
+            try:
+                yield entry["driver"]
+            except TimeoutException:
+                self._recycle(entry)
+                raise
+            except WebDriverException:
+                self.logger.warning("Chrome driver %s crashed", entry["profile"])
+                self._quit(entry)
+                raise
+            except BaseException:
+                self._recycle(entry)
+                raise
+            else:
+                self._recycle(entry)
+
+    def _recycle(self, entry):
+        entry["pages"] += 1
+        if entry["pages"] >= self.max_pages:
+            self.logger.debug(
+                "Replacing Chrome driver %s after %s pages",
+                entry["profile"],
+                entry["pages"],
+            )
+            self._quit(entry)
+        else:
+            self._idle.put(entry)
+
+    def _quit(self, entry):
+        try:
+            entry["driver"].quit()
+        except Exception as e:
+            self.logger.debug(e)
+        self._release_profile(entry["profile"])
+
+    def _release_profile(self, profile):
+        with self._lock:
+            self._free_profiles.append(profile)
+
+    def count_chapter(self, path):
+        """Count a chapter whose images were read with path, static or browser."""
+        with self._lock:
+            self.image_paths[path] += 1
+
+    def log_stats(self):
+        """Log and reset how the chapter images were read."""
+        with self._lock:
+            if self.image_paths:
+                self.logger.info(
+                    "Chapters: %s read from HTML, %s read with Chrome",
+                    self.image_paths["static"],
+                    self.image_paths["browser"],
+                )
+            self.image_paths.clear()
+
+    def close(self):
+        """Quit every idle driver."""
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(entry)
@@ -1,9 +1,12 @@
 """File handler module."""
 import os
 import shutil
+import threading
 import xml.etree.ElementTree as ET
 import zipfile
 
+from manga_dl.utilities.compression import CompressionPolicy
+
 
 class FileHandler:
     """
@@ -14,16 +17,17 @@ class FileHandler:
 
     Attributes:
         logger: An instance of log.Logger for log.
+        compression: The CompressionPolicy choosing how each file of a .cbz
+            file is compressed.
     """
 
-    def __init__(self, logger):
+    def __init__(self, logger, compression=None):
         self.logger = logger
+        self.compression = compression or CompressionPolicy()
 
-    def create_comic_info(
-        self, series, genres, summary, comic_info_path, language_iso="en"
-    ):
+    def comic_info(self, series, genres, summary, language_iso="en"):
         """
-        Create a ComicInfo.xml file for the .cbz file.
+        Return the contents of the ComicInfo.xml file for the .cbz file.
         """
         root = ET.Element("ComicInfo")
         ET.SubElement(root, "Series").text = series
@@ -31,12 +35,23 @@ class FileHandler:
         ET.SubElement(root, "Summary").text = summary
         ET.SubElement(root, "LanguageISO").text = language_iso
 
-        tree = ET.ElementTree(root)
+        return ET.tostring(root, encoding="utf-8", xml_declaration=True)
 
+    def create_comic_info(
+        self, series, genres, summary, comic_info_path, language_iso="en"
+    ):
+        """
+        Create a ComicInfo.xml file for the .cbz file.
+        """
         os.makedirs(comic_info_path, exist_ok=True)
         file_path = os.path.join(comic_info_path, "ComicInfo.xml")
 
-        tree.write(file_path, encoding="utf-8", xml_declaration=True)
+        # Chapters of a series share the file and can be packaged at once,
+        # so it is replaced in one step instead of rewritten in place.
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "wb") as writer:
+            writer.write(self.comic_info(series, genres, summary, language_iso))
+        os.replace(tmp_path, file_path)
         self.logger.info("ComicInfo.xml for %s created", series)
 
     def make_cbz(self, directory_path, compelte_dir, output_path, comic_info_path):
@@ -54,16 +69,27 @@ class FileHandler:
 
         for root, dirs, files in os.walk(directory_path):
             for file in files:
-                zipf.write(
-                    os.path.join(root, file), os.path.basename(os.path.join(root, file))
-                )
+                # Skip the download checkpoint.
+                if file.startswith("."):
+                    continue
+                self.add_file(zipf, os.path.join(root, file), file)
                 self.logger.info("%s added to %s", file, output_path)
 
-        zipf.write(comic_info_path, "ComicInfo.xml")
+        self.add_file(zipf, comic_info_path, "ComicInfo.xml")
         self.logger.info("ComicInfo.xml added to %s", output_path)
 
         zipf.close()
 
+    def add_file(self, zipf, path, name):
+        """
+        Add a file to a .cbz file, compressed as the compression policy says.
+        """
+        with open(path, "rb") as reader:
+            header = reader.read(16)
+
+        compress_type, compresslevel = self.compression.compression(header)
+        zipf.write(path, name, compress_type=compress_type, compresslevel=compresslevel)
+
     def cleanup(self, directory_path):
         """
         Cleanup a directory.
@@ -0,0 +1,239 @@
+"""Persistent HTTP cache revalidated with conditional requests."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class HttpCache:
+    """
+    An on-disk cache of pages that carry an ETag or Last-Modified header.
+
+    Cached pages are requested again with If-None-Match and If-Modified-Since
+    and a 304 response is answered from disk. The bodies are stored as files
+    next to an SQLite index and the least recently used ones are removed once
+    the cache grows over max_bytes.
+
+    The cache also keeps the chapters, title and metadata found for a series
+    together with the pages they came from, so when all of those pages come
+    back 304 on the next run the series does not have to be parsed again.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        path: The directory holding the index and the bodies.
+        max_bytes: The maximum total size of the stored bodies.
+    """
+
+    def __init__(self, logger, path, max_bytes=200 * 1024 * 1024):
+        self.logger = logger
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(path, "index.db"), check_same_thread=False
+        )
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                headers TEXT NOT NULL,
+                request_headers TEXT NOT NULL,
+                encoding TEXT,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed);
+            CREATE TABLE IF NOT EXISTS series (
+                url TEXT PRIMARY KEY,
+                pages TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            """
+        )
+
+    def _body_path(self, url):
+        return os.path.join(self.path, hashlib.sha1(url.encode()).hexdigest())
+
+    def _get(self, url):
+        with self._lock:
+            return self._db.execute(
+                "SELECT etag, last_modified, headers, request_headers, encoding, size "
+                "FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+    def conditional_headers(self, url):
+        """Return the validator headers for a cached page."""
+        row = self._get(url)
+        if row is None:
+            return {}
+
+        headers = {}
+        if row[0]:
+            headers["If-None-Match"] = row[0]
+        if row[1]:
+            headers["If-Modified-Since"] = row[1]
+
+        return headers
+
+    def request_headers(self, url):
+        """Return the headers the cached page was requested with."""
+        row = self._get(url)
+        return json.loads(row[3]) if row else None
+
+    def load(self, url, not_modified):
+        """
+        Build a 200 response from the cached body of a 304 response.
+
+        Returns None if the page is no longer cached.
+        """
+        row = self._get(url)
+        try:
+            with open(self._body_path(url), "rb") as reader:
+                body = reader.read()
+        except OSError:
+            body = None
+
+        if row is None or body is None:
+            self.forget(url)
+            return None
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = url
+        response.request = not_modified.request
+        response.headers = CaseInsensitiveDict(json.loads(row[2]))
+        response.headers.update(not_modified.headers)
+        response.encoding = row[4]
+        response._content = body
+        response.from_cache = True
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET accessed = ? WHERE url = ?", (time.time(), url)
+            )
+            self._db.commit()
+            self.hits += 1
+            self.bytes_saved += row[5]
+
+        return response
+
+    def store(self, url, response, request_headers):
+        """Store a 200 response if it can be revalidated later."""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        with self._lock:
+            self.misses += 1
+
+        if not etag and not last_modified:
+            return
+
+        body = response.content
+        with open(self._body_path(url), "wb") as writer:
+            writer.write(body)
+
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            if key.lower() in ("content-type", "etag", "last-modified")
+        }
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    etag,
+                    last_modified,
+                    json.dumps(headers),
+                    json.dumps(dict(request_headers or {})),
+                    response.encoding,
+                    len(body),
+                    time.time(),
+                ),
+            )
+            self._db.commit()
+            self._evict()
+
+    def forget(self, url):
+        """Remove a page from the cache."""
+        with self._lock:
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._db.commit()
+        try:
+            os.remove(self._body_path(url))
+        except OSError:
+            pass
+
+    def _evict(self):
+        query = "SELECT COALESCE(SUM(size), 0) FROM pages"
+        total = self._db.execute(query).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for url, size in self._db.execute(
+            "SELECT url, size FROM pages ORDER BY accessed"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            try:
+                os.remove(self._body_path(url))
+            except OSError:
+                pass
+            total -= size
+
+        self._db.commit()
+
+    def load_series(self, url):
+        """Return the pages and the stored data of a series, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT pages, data FROM series WHERE url = ?", (url,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0]), json.loads(row[1])
+
+    def store_series(self, url, pages, data):
+        """Store the data of a series if every page it came from is cached."""
+        if not pages or any(self._get(page) is None for page in pages):
+            return
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO series VALUES (?, ?, ?)",
+                (url, json.dumps(pages), json.dumps(data)),
+            )
+            self._db.commit()
+
+    def reset_stats(self):
+        """Reset the statistics at the start of a run."""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.bytes_saved = 0
+
+    def log_stats(self):
+        """Log how many pages were answered from the cache."""
+        self.logger.info(
+            "HTTP cache: %s not modified, %s fetched, %s KB not downloaded",
+            self.hits,
+            self.misses,
+            self.bytes_saved // 1024,
+        )
@@ -1,12 +1,18 @@
 """Download images helper"""
 
+import concurrent.futures
+import contextlib
 import os
 import re
 import time
-import shutil
+
 import requests
 
+from manga_dl.utilities.cbz_writer import CbzWriter
+from manga_dl.utilities.checkpoint import ChapterCheckpoint
 from manga_dl.utilities.file_handler import FileHandler
+from manga_dl.utilities.metrics import Metrics, site_of
+from manga_dl.utilities.packager import package_chapter
 
 
 class ImageDownloader:
@@ -17,92 +23,338 @@ class ImageDownloader:
 
     Attributes:
         logger: An instance of log.Logger for log.
+        session: The SessionPool used for HTTP requests.
+        image_threads: The number of images of a chapter downloaded at once.
+        download_slots: A semaphore shared by every chapter that caps the
+            number of images downloading at the same time.
+        stream_cbz: Write the images straight into the .cbz file instead of
+            a tmp directory that is zipped afterwards.
+        compression: The CompressionPolicy used for the .cbz files.
+        packager: An optional Packager packaging the chapters in the
+            background, otherwise they are packaged by the calling thread.
+        reporter: An optional AtHomeReporter the MangaDex@Home downloads
+            are reported to.
+        image_failover: An optional AtHomeNodes moving the images of a
+            chapter to another node when theirs fails.
+        retry_policy: The RetryPolicy of session, repeating images cut off
+            while they are read.
+        metrics: The Metrics of session every image download and
+            packaged chapter is timed in.
+        bandwidth_limiter: An optional BandwidthLimiter pacing the images
+            as they are read.
+        site: The host of the series, the site label of the packaging
+            metrics.
     """
 
-    def __init__(self, logger, headers):
+    def __init__(
+        self,
+        logger,
+        headers,
+        session,
+        image_threads=1,
+        download_slots=None,
+        stream_cbz=False,
+        compression=None,
+        packager=None,
+        reporter=None,
+        image_failover=None,
+        bandwidth_limiter=None,
+        site="",
+    ):
         self.logger = logger
         self.headers_image = headers
+        self.session = session
+        self.image_threads = image_threads
+        self.download_slots = download_slots
+        self.stream_cbz = stream_cbz
+        self.compression = compression
+        self.packager = packager
+        self.reporter = reporter
+        self.image_failover = image_failover
+        self.bandwidth_limiter = bandwidth_limiter
+        self.site = site
+        self.retry_policy = getattr(session, "retry_policy", None)
+        self.metrics = getattr(session, "metrics", None) or Metrics(logger)
 
     def download_image(
-        self, chapter, image, path, progress, download_task, tmp_path, image_index
+        self, chapter, image, path, progress, download_task, checkpoint=None
     ):
         """
         Download a single image.
+
+        The image is read into a .part file next to path. A .part file left
+        by an interrupted download is continued with a Range request when
+        checkpoint holds the validator of its response, sent as If-Range so
+        a changed image is downloaded again from the start.
         """
-        start_time = time.time()
-        image_size = 0
-        success = False
+        part_path = f"{path}.part"
+        name = os.path.basename(path)
 
-        if "webtoon" in image:
-            clean_url = image.split("?")[0]
-            image_ext = os.path.splitext(clean_url)[1]
-            image_name = f"{str(image_index).zfill(3)}{image_ext}"
-            webtoons_path = os.path.join(tmp_path, image_name)
-            result = requests.get(
-                url=image,
-                headers=self.headers_image,
-                stream=True,
-                timeout=30,
+        def headers():
+            # Resume a partial image left by an interrupted download.
+            validator = checkpoint.validator(name) if checkpoint else None
+            if validator and os.path.exists(part_path) and os.path.getsize(part_path):
+                return {
+                    **self.headers_image,
+                    "Range": f"bytes={os.path.getsize(part_path)}-",
+                    "If-Range": validator,
+                }
+            return self.headers_image
+
+        def read(result):
+            mode = "wb"
+            if result.status_code == 206:
+                mode = "ab"
+                self.logger.debug("Resuming %s", image)
+            elif checkpoint is not None:
+                checkpoint.partial(name, self.validator(result))
+            with open(part_path, mode) as writer:
+                for chunk in self.iter_chunks(result, image, progress, download_task):
+                    writer.write(chunk)
+            return os.path.getsize(part_path)
+
+        result, size = self.request_image(image, read, headers, stream=True)
+        if size is None:
+            if result.status_code == 416:
+                # The partial image no longer matches, start over next time.
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(part_path)
+                if checkpoint is not None:
+                    checkpoint.partial(name, None)
+            self.logger.error(
+                "[bold red blink]Unable to download page[/] "
+                "[medium_spring_green]%s[/] from chapter "
+                "[medium_spring_green]%s[/], request returned error "
+                "[bold red blink]%s[/]",
+                image,
+                chapter,
+                result.status_code,
             )
-            if result.status_code == 200:
-                result.raw.decode_content = True
-                with open(webtoons_path, "wb") as f:
-                    shutil.copyfileobj(result.raw, f)
-                progress.update(download_task, advance=1)
-                self.logger.info("Downloaded Ch. %s image: %s", chapter, image_name)
-                return True
-            else:
-                self.logger.error(
-                    "[bold red blink]Unable to download page[/][medium_spring_green]%d[/]"
-                    "from chapter [medium_spring_green]%d[/], request returned"
-                    "error [bold red blink]%d[/]",
-                    image,
-                    chapter,
-                    result.status_code,
-                )
-                return False
-        else:
-            with open(path, "wb") as writer:
-                result = requests.get(
+            return False
+
+        expected = self.expected_size(result, part_path)
+        if expected is not None and size != expected:
+            self.logger.error(
+                "Ch. %s image %s is incomplete, %s of %s bytes",
+                chapter,
+                image,
+                size,
+                expected,
+            )
+            return False
+
+        os.replace(part_path, path)
+        progress.update(download_task, advance=1)
+        self.logger.info("Downloaded Ch. %s image: %s", chapter, image)
+        return size
+
+    def iter_chunks(self, result, image, progress, download_task):
+        """
+        Yield the body of an image response in chunks, counting them in the
+        progress of download_task and pacing them to the bandwidth limits.
+        """
+        for chunk in result.iter_content(chunk_size=65536):
+            progress.add_bytes(download_task, len(chunk))
+            if self.bandwidth_limiter is not None:
+                self.bandwidth_limiter.throttle(image, len(chunk))
+            yield chunk
+
+        progress.flush_bytes()
+
+    @staticmethod
+    def validator(result):
+        """
+        Return the ETag or Last-Modified a partial image can be continued
+        with, or None. Weak ETags cannot be used in If-Range.
+        """
+        etag = result.headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            return etag
+
+        return result.headers.get("Last-Modified")
+
+    @staticmethod
+    def expected_size(result, part_path):
+        """
+        Return the size an image should have once the response is read,
+        or None if the server did not tell.
+        """
+        if result.status_code == 206:
+            content_range = result.headers.get("Content-Range", "")
+            total = content_range.rpartition("/")[2]
+            return int(total) if total.isdigit() else None
+
+        # Encoded bodies are longer or shorter than the decoded image.
+        if result.headers.get("Content-Encoding", "identity") != "identity":
+            return None
+        length = result.headers.get("Content-Length", "")
+        return int(length) if length.isdigit() else None
+
+    def request_image(self, image, read, headers=None, stream=False):
+        """
+        Request an image and pass a successful response to read, moving to
+        another MangaDex@Home node if its node fails while image_failover
+        can provide one. A response cut off while it is read is requested
+        again as the retry policy allows.
+
+        headers is called before every request for the request headers.
+        Returns the last response and the size returned by read, None if
+        the image could not be downloaded.
+        """
+        attempts = self.retry_policy.start() if self.retry_policy else None
+        while True:
+            if self.image_failover is not None:
+                image = self.image_failover.current(image)
+
+            start_time = time.time()
+            try:
+                result = self.session.get(
                     url=image,
-                    headers=self.headers_image,
+                    headers=headers() if headers else self.headers_image,
+                    stream=stream,
+                    stage=None,
                     timeout=30,
                 )
-                if result.status_code == 200:
-                    success = True
-                    image_size = len(result.content)
-                    elapsed_time = (time.time() - start_time) * 1000
-                    writer.write(result.content)
-                    progress.update(download_task, advance=1)
-                    self.logger.info("Downloaded Ch. %s image: %s", chapter, image)
-                    return len(result.content)
-                else:
-                    self.logger.error(
-                        "[bold red blink]Unable to download page[/][medium_spring_green]%d[/]"
-                        "from chapter [medium_spring_green]%d[/], request returned"
-                        "error [bold red blink]%d[/]",
-                        image,
-                        chapter,
-                        result.status_code,
-                    )
-                    success = False
-                    elapsed_time = (time.time() - start_time) * 1000
-                    return False
-
-        if re.match(r".*/data/(?P<chapter_hash>[^/]+)/(?P<filename>.+)$", image):
-            cached = result.headers.get("X-Cache", "").startswith("HIT")
-            report_data = {
-                "url": image,
-                "success": success,
-                "cached": cached,
-                "bytes": image_size,
-                "duration": elapsed_time,
-            }
-            report_response = requests.post(
-                "https://api.mangadex.network/report", json=report_data, timeout=30
+            except requests.RequestException:
+                if self.image_failover is None or not self.image_failover.failed(image):
+                    raise
+                continue
+
+            try:
+                size = read(result) if result.status_code in (200, 206) else None
+            except requests.RequestException as e:
+                result.close()
+                if self.image_failover is not None and self.image_failover.failed(
+                    image
+                ):
+                    continue
+
+                delay = attempts.delay(error=e) if attempts else None
+                if delay is None:
+                    raise
+
+                self.logger.warning("Retrying %s in %.1fs: %s", image, delay, e)
+                time.sleep(delay)
+                continue
+
+            self.report_image(image, result, size, start_time)
+            if size is not None:
+                if self.image_failover is not None:
+                    self.image_failover.observe(image, size, time.time() - start_time)
+                return result, size
+
+            result.close()
+            if self.image_failover is None or not self.image_failover.failed(image):
+                return result, None
+
+    def report_image(self, image, result, size, start_time):
+        """
+        Queue the MangaDex@Home report of an image download.
+        """
+        if self.reporter is None:
+            return
+
+        self.reporter.report(
+            image,
+            size is not None,
+            result.headers.get("X-Cache", "").startswith("HIT"),
+            size or 0,
+            (time.time() - start_time) * 1000,
+        )
+
+    def stream_image(self, chapter, image, writer, index, progress, download_task):
+        """
+        Download a single image into the .cbz file of its chapter.
+        """
+        body = bytearray()
+
+        def read(result):
+            body.clear()
+            for chunk in self.iter_chunks(result, image, progress, download_task):
+                body.extend(chunk)
+            return len(body)
+
+        result, size = self.request_image(image, read, stream=True)
+        if size is None:
+            self.logger.error(
+                "Unable to download page %s from chapter %s, request returned "
+                "error %s",
+                image,
+                chapter,
+                result.status_code,
             )
-            if report_response.status_code != 200:
-                self.logger.error("Failed to report download status to MangaDex.")
+            return False
+
+        writer.add_page(index, self.get_image_name(image, index), bytes(body))
+        progress.update(download_task, advance=1)
+        self.logger.info("Downloaded Ch. %s image: %s", chapter, image)
+        return size
+
+    def download_image_slot(self, download, *args):
+        """
+        Download a single image once a global download slot is free.
+        """
+        try:
+            if self.download_slots is None:
+                return self.timed_image(download, *args)
+
+            with self.download_slots:
+                return self.timed_image(download, *args)
+
+        except requests.RequestException as e:
+            self.logger.error("Unable to download Ch. %s image: %s", args[0], args[1])
+            self.logger.error(e)
+            return False
+
+    def timed_image(self, download, chapter, image, *args):
+        """
+        Download a single image with download, timing it in the metrics.
+        """
+        with self.metrics.time("download_image", site_of(image)) as sample:
+            size = download(chapter, image, *args)
+            sample["bytes"] = size or 0
+            sample["failed"] = not size
+            return size
+
+    def run_jobs(self, download, jobs):
+        """
+        Download every job with download, image_threads at a time.
+
+        Returns True if every image was downloaded.
+        """
+        if self.image_threads > 1 and len(jobs) > 1:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(self.image_threads, len(jobs))
+            ) as executor:
+                return all(
+                    [
+                        bool(image_size)
+                        for image_size in executor.map(
+                            lambda job: self.download_image_slot(download, *job), jobs
+                        )
+                    ]
+                )
+
+        return all([bool(self.download_image_slot(download, *job)) for job in jobs])
+
+    def get_image_name(self, image_url, index):
+        """
+        Get the file name an image is saved under inside the chapter.
+        """
+        if "webtoon" in image_url:
+            clean_url = image_url.split("?")[0]
+            image_ext = os.path.splitext(clean_url)[1]
+            return f"{str(index).zfill(3)}{image_ext}"
+
+        match = re.match(
+            r".*/data(-saver)?/(?P<chapter_hash>[^/]+)/(?P<filename>.+)$", image_url
+        )
+        if match:
+            file_extension = os.path.splitext(match.group("filename"))[1]
+            image = f"{str(index+1).zfill(3)}{file_extension}"
+            return self.sanitize_filename(os.path.basename(image))
+
+        return self.sanitize_filename(os.path.basename(image_url))
 
     def sanitize_filename(self, filename):
         """Sanitize a string to be safe for use as a filename."""
@@ -138,45 +390,119 @@ class ImageDownloader:
         Download images for a given manga chapter.
         """
         complete_dir = os.path.join(save_location, sanitized_title_id)
-        if not os.path.exists(complete_dir):
-            os.makedirs(complete_dir)
+        os.makedirs(complete_dir, exist_ok=True)
 
-        tmp_path = os.path.join(
-            save_location, "tmp", sanitized_title_id, f"Ch. {chapter}"
-        )
-        if not os.path.exists(tmp_path):
-            os.makedirs(tmp_path)
+        tmp_path = self.chapter_tmp_path(save_location, sanitized_title_id, chapter)
+        os.makedirs(tmp_path, exist_ok=True)
 
-        self.logger.info("Downloading %s Ch. %s", sanitized_title_id, chapter)
+        names = [
+            self.get_image_name(image_url, i) for i, image_url in enumerate(images)
+        ]
+        checkpoint = ChapterCheckpoint(self.logger, tmp_path)
+        checkpoint.start(names, images)
 
-        results = []
-        for i, image_url in enumerate(images):
-            match = re.match(
-                r".*/data/(?P<chapter_hash>[^/]+)/(?P<filename>.+)$", image_url
-            )
-            if match:
-                file_extension = os.path.splitext(match.group("filename"))[1]
-                image = f"{str(i+1).zfill(3)}{file_extension}"
-                image_name = self.sanitize_filename(os.path.basename(image))
-            else:
-                image_name = self.sanitize_filename(os.path.basename(image_url))
+        jobs = []
+        for image_url, name in zip(images, names):
+            if checkpoint.is_complete(name):
+                progress.update(download_task, advance=1)
+                continue
+            image_path = os.path.join(tmp_path, name)
+            jobs.append((chapter, image_url, image_path, progress, download_task))
 
-            image_path = os.path.join(tmp_path, image_name)
+        if len(jobs) < len(images):
+            self.logger.info(
+                "Resuming %s Ch. %s, %s of %s pages already downloaded",
+                sanitized_title_id,
+                chapter,
+                len(images) - len(jobs),
+                len(images),
+            )
+        else:
+            self.logger.info("Downloading %s Ch. %s", sanitized_title_id, chapter)
 
-            image_size = self.download_image(
-                chapter, image_url, image_path, progress, download_task, tmp_path, i
+        def download(chapter, image_url, image_path, progress, download_task):
+            size = self.download_image(
+                chapter, image_url, image_path, progress, download_task, checkpoint
             )
-            if image_size:
-                results.append(True)
-            else:
-                results.append(False)
+            if size:
+                checkpoint.complete(os.path.basename(image_path))
+            return size
 
-        completed = all(results)
+        completed = self.run_jobs(download, jobs)
         if not completed:
+            checkpoint.failed()
             self.logger.error("Incomplete download of %s Ch. %s", title_id, chapter)
 
         return completed
 
+    @staticmethod
+    def chapter_tmp_path(save_location, sanitized_title_id, chapter):
+        """Return the tmp directory the pages of a chapter are downloaded to."""
+        return os.path.join(save_location, "tmp", sanitized_title_id, f"Ch. {chapter}")
+
+    def resumable_images(self, save_location, sanitized_title_id, chapter, max_age):
+        """
+        Return the image URLs of an unfinished download of a chapter if they
+        were resolved at most max_age seconds ago, otherwise None.
+        """
+        if self.stream_cbz or max_age <= 0:
+            return None
+
+        tmp_path = self.chapter_tmp_path(save_location, sanitized_title_id, chapter)
+        if not os.path.isdir(tmp_path):
+            return None
+
+        images = ChapterCheckpoint(self.logger, tmp_path).resumable_images(max_age)
+        if images:
+            self.logger.info(
+                "Reusing the image list of %s Ch. %s", sanitized_title_id, chapter
+            )
+
+        return images
+
+    def stream_chapter(
+        self,
+        images,
+        title_id,
+        chapter,
+        genres,
+        summary,
+        complete_dir,
+        progress,
+        download_task,
+    ):
+        """
+        Download the images of a chapter straight into its .cbz file.
+        """
+        os.makedirs(complete_dir, exist_ok=True)
+        writer = CbzWriter(
+            self.logger,
+            os.path.join(complete_dir, f"Ch. {chapter}.cbz"),
+            len(images),
+            compression=self.compression,
+        )
+
+        self.logger.info("Downloading %s Ch. %s", title_id, chapter)
+
+        jobs = [
+            (chapter, image_url, writer, i, progress, download_task)
+            for i, image_url in enumerate(images)
+        ]
+        try:
+            completed = self.run_jobs(self.stream_image, jobs)
+        except BaseException:
+            writer.abort()
+            raise
+
+        if not completed:
+            writer.abort()
+            self.logger.error("Incomplete download of %s Ch. %s", title_id, chapter)
+            return False
+
+        return writer.finish(
+            FileHandler(self.logger).comic_info(title_id, genres, summary)
+        )
+
     def download_chapter(
         self,
         x,
@@ -190,11 +516,33 @@ class ImageDownloader:
         complete_dir,
         chapter_task,
     ):
-        """Download a chapter."""
+        """
+        Download a chapter.
+
+        Returns a concurrent.futures.Future resolving to True once the
+        chapter is packaged. With a packager the images are packaged in the
+        background and the calling thread can start on the next chapter.
+        """
         download_task = progress.add_task(
             f"[cyan]Downloading Ch. {x}", total=len(images)
         )
-        completed = self.download_images(
+        packaged = concurrent.futures.Future()
+        if self.stream_cbz:
+            completed = self.stream_chapter(
+                images,
+                title_id,
+                x,
+                genres,
+                summary,
+                complete_dir,
+                progress,
+                download_task,
+            )
+            if completed:
+                self.logger.info("done zipping: Ch. %s", x)
+            packaged.set_result(completed)
+
+        elif not self.download_images(
             images,
             title_id,
             sanitized_title_id,
@@ -202,30 +550,65 @@ class ImageDownloader:
             save_location=save_location,
             progress=progress,
             download_task=download_task,
-        )
+        ):
+            packaged.set_result(False)
 
-        if completed:
-            FileHandler(self.logger).create_comic_info(
-                series=title_id,
-                genres=genres,
-                summary=summary,
-                comic_info_path=os.path.join(save_location, "tmp", sanitized_title_id),
+        elif self.packager is None:
+            self.package_chapter(
+                x,
+                title_id,
+                sanitized_title_id,
+                save_location,
+                genres,
+                summary,
+                complete_dir,
             )
-            FileHandler(self.logger).make_cbz(
-                directory_path=os.path.join(
-                    save_location, "tmp", sanitized_title_id, f"Ch. {x}"
-                ),
-                compelte_dir=complete_dir,
-                output_path=f"{x}.cbz",
-                comic_info_path=os.path.join(
-                    save_location, "tmp", sanitized_title_id, "ComicInfo.xml"
-                ),
-            )
-            FileHandler(self.logger).cleanup(
-                directory_path=os.path.join(
-                    save_location, "tmp", sanitized_title_id, f"Ch. {x}"
-                )
+            packaged.set_result(True)
+
+        else:
+            packaged = self.packager.submit(
+                x,
+                title_id,
+                sanitized_title_id,
+                save_location,
+                genres,
+                summary,
+                complete_dir,
+                self.site,
             )
-            self.logger.info("done zipping: Ch. %s", x)
-            progress.remove_task(download_task)
-            progress.update(chapter_task, advance=1)
+
+        def finished(future):
+            if future.exception() is not None:
+                self.logger.error("Unable to package Ch. %s", x)
+                self.logger.error(future.exception())
+            elif future.result():
+                progress.remove_task(download_task)
+                progress.update(chapter_task, advance=1)
+
+        packaged.add_done_callback(finished)
+        return packaged
+
+    def package_chapter(
+        self,
+        x,
+        title_id,
+        sanitized_title_id,
+        save_location,
+        genres,
+        summary,
+        complete_dir,
+    ):
+        """Package a downloaded chapter into a .cbz file and remove its images."""
+        timings = package_chapter(
+            self.logger,
+            self.compression,
+            x,
+            title_id,
+            sanitized_title_id,
+            save_location,
+            genres,
+            summary,
+            complete_dir,
+        )
+        for stage, seconds in timings.items():
+            self.metrics.record(stage, self.site, seconds)
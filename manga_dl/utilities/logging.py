@@ -10,8 +10,8 @@ from rich.console import Console
 from rich.logging import RichHandler
 
 
-def setup_logging():
-    """Setup logging."""
+def setup_logging(log_dir="/config/logs"):
+    """Setup logging, writing the log files to log_dir."""
     sys.stdout.reconfigure(encoding="utf-8")
     console = Console()
     traceback.install(console=console, show_locals=False)
@@ -24,7 +24,6 @@ def setup_logging():
 
     current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     log_filename = f"manga_dl_{current_time}.log"
-    log_dir = "/config/logs"
     os.makedirs(log_dir, exist_ok=True)
     log_filepath = os.path.join(log_dir, log_filename)
     file_handler = RotatingFileHandler(
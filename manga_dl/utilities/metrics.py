@@ -0,0 +1,204 @@
+"""Per-stage timing and throughput metrics."""
+
+import bisect
+import contextlib
+import http.server
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def site_of(url):
+    """Return the host of url, the site label of its metrics."""
+    return urlparse(url).hostname or ""
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Thread-safe counters and latency histograms labelled by stage and site.
+
+    A stage is a step of a download, such as page, parse, chapter_images,
+    download_image, make_cbz or cleanup, and the site is the host the time
+    was spent on, or the host of the series for the stages run on its local
+    files. Every sample
+    counts a call, its duration, whether it failed and the bytes it moved.
+    The metrics add up over the lifetime of the process and can be served
+    in the Prometheus text format and dumped as JSON.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        buckets: The upper bounds in seconds of the histogram buckets.
+    """
+
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, logger, buckets=None):
+        self.logger = logger
+        self.buckets = tuple(sorted(buckets or self.default_buckets))
+        self.started = time.time()
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def record(self, stage, site, seconds, size=0, failed=False):
+        """Record a call of stage on site that took seconds and moved size bytes."""
+        with self._lock:
+            sample = self._stages.get((stage, site))
+            if sample is None:
+                sample = self._stages[(stage, site)] = {
+                    "count": 0,
+                    "errors": 0,
+                    "seconds": 0.0,
+                    "bytes": 0,
+                    "buckets": [0] * len(self.buckets),
+                }
+
+            sample["count"] += 1
+            sample["errors"] += bool(failed)
+            sample["seconds"] += seconds
+            sample["bytes"] += size or 0
+            index = bisect.bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                sample["buckets"][index] += 1
+
+    @contextlib.contextmanager
+    def time(self, stage, site=""):
+        """
+        Time the block as a call of stage on site.
+
+        Yields a dict whose bytes and failed the block can set, a block
+        raising an exception is recorded as failed.
+        """
+        sample = {"bytes": 0, "failed": False}
+        start = time.perf_counter()
+        try:
+            yield sample
+        except BaseException:
+            sample["failed"] = True
+            raise
+        finally:
+            self.record(
+                stage,
+                site,
+                time.perf_counter() - start,
+                sample["bytes"],
+                sample["failed"],
+            )
+
+    def snapshot(self):
+        """Return the metrics as a JSON serializable dict."""
+        with self._lock:
+            stages = [
+                {
+                    "stage": stage,
+                    "site": site,
+                    "count": sample["count"],
+                    "errors": sample["errors"],
+                    "seconds": round(sample["seconds"], 6),
+                    "bytes": sample["bytes"],
+                    "buckets": dict(zip(map(str, self.buckets), sample["buckets"])),
+                }
+                for (stage, site), sample in sorted(self._stages.items())
+            ]
+
+        return {"started": self.started, "time": time.time(), "stages": stages}
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            stages = sorted(
+                (key, {**sample, "buckets": list(sample["buckets"])})
+                for key, sample in self._stages.items()
+            )
+
+        lines = [
+            "# HELP manga_dl_stage_seconds Time spent in each stage of a download.",
+            "# TYPE manga_dl_stage_seconds histogram",
+        ]
+        for (stage, site), sample in stages:
+            labels = f'stage="{_label(stage)}",site="{_label(site)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, sample["buckets"]):
+                cumulative += count
+                lines.append(
+                    f'manga_dl_stage_seconds_bucket{{{labels},le="{bound}"}} '
+                    f"{cumulative}"
+                )
+            lines.append(
+                f'manga_dl_stage_seconds_bucket{{{labels},le="+Inf"}} '
+                f'{sample["count"]}'
+            )
+            lines.append(f'manga_dl_stage_seconds_sum{{{labels}}} {sample["seconds"]}')
+            lines.append(f'manga_dl_stage_seconds_count{{{labels}}} {sample["count"]}')
+
+        for name, key, description in (
+            ("manga_dl_stage_errors_total", "errors", "Failed calls of each stage."),
+            ("manga_dl_stage_bytes_total", "bytes", "Bytes moved by each stage."),
+        ):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for (stage, site), sample in stages:
+                lines.append(
+                    f'{name}{{stage="{_label(stage)}",site="{_label(site)}"}} '
+                    f"{sample[key]}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write the metrics as JSON to path."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as writer:
+            json.dump(self.snapshot(), writer, indent=2)
+        os.replace(tmp_path, path)
+        self.logger.info("Wrote metrics to %s", path)
+
+    def serve(self, port, address="127.0.0.1"):
+        """
+        Serve the metrics on http://address:port/metrics from a daemon thread,
+        and as JSON on /metrics.json.
+        """
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/metrics":
+                    body = metrics.render().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                metrics.logger.debug("Metrics endpoint: " + format, *args)
+
+        self._server = http.server.ThreadingHTTPServer((address, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="metrics", daemon=True
+        ).start()
+        self.logger.info("Serving metrics on http://%s:%s/metrics", address, port)
+
+    def close(self):
+        """Stop serving the metrics."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,195 @@
+"""Package downloaded chapters into .cbz files on a pool of workers."""
+
+import concurrent.futures
+import logging
+import os
+import time
+
+from manga_dl.utilities.file_handler import FileHandler
+
+
+def package_chapter(
+    logger,
+    compression,
+    x,
+    title_id,
+    sanitized_title_id,
+    save_location,
+    genres,
+    summary,
+    complete_dir,
+):
+    """
+    Package a downloaded chapter into a .cbz file and remove its images.
+
+    This is a module level function so it can be sent to a worker process.
+    Returns the seconds spent on the make_cbz and cleanup stages once the
+    chapter is packaged.
+    """
+    tmp_dir = os.path.join(save_location, "tmp", sanitized_title_id)
+    file_handler = FileHandler(logger, compression)
+    file_handler.create_comic_info(
+        series=title_id,
+        genres=genres,
+        summary=summary,
+        comic_info_path=tmp_dir,
+    )
+    start = time.perf_counter()
+    file_handler.make_cbz(
+        directory_path=os.path.join(tmp_dir, f"Ch. {x}"),
+        compelte_dir=complete_dir,
+        output_path=f"{x}.cbz",
+        comic_info_path=os.path.join(tmp_dir, "ComicInfo.xml"),
+    )
+    zipped = time.perf_counter()
+    file_handler.cleanup(directory_path=os.path.join(tmp_dir, f"Ch. {x}"))
+    logger.info("done zipping: Ch. %s", x)
+    return {"make_cbz": zipped - start, "cleanup": time.perf_counter() - zipped}
+
+
+class _LogCollector(logging.Handler):
+    """Keep the log records of a worker process to send them to the parent."""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+def package_chapter_in_process(compression, *args):
+    """
+    Package a chapter on a worker process with package_chapter.
+
+    The worker writes no log itself, its messages are returned with the
+    timings and logged by the parent process.
+    """
+    collector = _LogCollector()
+    logger = logging.getLogger("manga_dl.packager")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(collector)
+    try:
+        timings = package_chapter(logger, compression, *args)
+    finally:
+        logger.removeHandler(collector)
+
+    return timings, collector.messages
+
+
+class Packager:
+    """
+    A pool of workers packaging chapters while the next ones download.
+
+    In thread mode the workers are started at the start of every run and
+    stopped at its end. In process mode packaging runs on every core
+    instead of competing for the GIL. The process pool is started once,
+    before any other thread of manga_dl exists so its workers are forked
+    from a single threaded process, and is kept for the life of the
+    process. The workers write no log, their messages are sent back and
+    logged by the parent.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        workers: The number of chapters packaged at once.
+        mode: Either "thread" or "process".
+        compression: The CompressionPolicy used for the .cbz files.
+        metrics: An optional Metrics the packaging stages are timed in.
+    """
+
+    def __init__(
+        self, logger, workers=2, mode="thread", compression=None, metrics=None
+    ):
+        self.logger = logger
+        self.workers = workers
+        self.mode = mode
+        self.compression = compression
+        self.metrics = metrics
+        self.executor = None
+
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported packaging mode: {mode}")
+
+    def start(self):
+        """
+        Start the workers, before the download threads of a run. The
+        process pool must be started before any other thread.
+        """
+        if self.executor is not None:
+            return
+
+        if self.mode == "process":
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers
+            )
+            self.executor.submit(int).result()
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="packager"
+            )
+
+    def submit(
+        self,
+        x,
+        title_id,
+        sanitized_title_id,
+        save_location,
+        genres,
+        summary,
+        complete_dir,
+        site="",
+    ):
+        """
+        Queue a downloaded chapter for packaging.
+
+        site is the host of the series, the packaging stages are timed
+        under it. Returns a concurrent.futures.Future resolving to True once
+        the chapter is packaged.
+        """
+        if self.executor is None:
+            raise RuntimeError("The packager was not started")
+
+        packaged = concurrent.futures.Future()
+
+        def finished(future):
+            if future.exception() is not None:
+                packaged.set_exception(future.exception())
+                return
+
+            timings = future.result()
+            if self.mode == "process":
+                timings, messages = timings
+                for level, message in messages:
+                    self.logger.log(level, "%s", message)
+
+            # Timed on the worker, which may be another process.
+            if self.metrics is not None:
+                for stage, seconds in timings.items():
+                    self.metrics.record(stage, site, seconds)
+            packaged.set_result(True)
+
+        if self.mode == "process":
+            task = (package_chapter_in_process, self.compression)
+        else:
+            task = (package_chapter, self.logger, self.compression)
+        self.executor.submit(
+            *task,
+            x,
+            title_id,
+            sanitized_title_id,
+            save_location,
+            genres,
+            summary,
+            complete_dir,
+        ).add_done_callback(finished)
+        return packaged
+
+    def close(self):
+        """
+        Wait for the queued chapters and stop the thread workers, the
+        process pool is kept for the next run.
+        """
+        if self.executor is not None and self.mode == "thread":
+            self.executor.shutdown(wait=True)
+            self.executor = None
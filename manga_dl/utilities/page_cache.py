@@ -0,0 +1,88 @@
+"""Per-run memo of fetched pages and parsed documents."""
+
+import threading
+from collections import OrderedDict
+
+
+class PageCache:
+    """
+    A thread-safe memo of pages and parsed documents keyed by URL.
+
+    The adapters ask for the same series page several times per run, once
+    for the title, once for the chapters and once for the metadata. The
+    memo makes sure each of them is downloaded and parsed once. Concurrent
+    callers asking for the same key wait for the first one to finish instead
+    of fetching it again. It is cleared at the start of every run and holds
+    at most max_entries entries, evicting the least recently used.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        max_entries: The maximum number of entries kept.
+    """
+
+    def __init__(self, logger, max_entries=64):
+        self.logger = logger
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+
+            return False, None
+
+    def get(self, key, load, cacheable=None):
+        """
+        Return the value stored for key, calling load() to create it if needed.
+
+        Args:
+            key: A hashable key, usually including the URL.
+            load: A callable creating the value.
+            cacheable: An optional callable deciding if a loaded value is kept.
+        """
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+
+            value = load()
+            with self._lock:
+                self.misses += 1
+                if cacheable is None or cacheable(value):
+                    self._entries[key] = value
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                self._key_locks.pop(key, None)
+
+        return value
+
+    def clear(self):
+        """Drop every entry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def log_stats(self):
+        """Log the hit statistics."""
+        total = self.hits + self.misses
+        self.logger.info(
+            "Page cache: %s hits, %s misses (%.0f%% hit rate)",
+            self.hits,
+            self.misses,
+            (self.hits / total * 100) if total else 0,
+        )
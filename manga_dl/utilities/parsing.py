@@ -0,0 +1,36 @@
+"""Parse only the parts of a page a site adapter reads."""
+
+import importlib.util
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# lxml builds the same tree several times faster than the parser in the
+# standard library, it is used whenever it is installed.
+PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+def page_parts(*parts):
+    """
+    Return a SoupStrainer keeping only the elements matching one of parts.
+
+    A part is a (tag, attribute, value) tuple matching a tag, or any tag for
+    None, whose attribute holds value as one of its space separated words.
+    The children of a kept element are all kept.
+    """
+
+    def match(name, attrs):
+        for tag, attribute, value in parts:
+            if tag is not None and name != tag:
+                continue
+
+            if value in (attrs.get(attribute) or "").split():
+                return True
+
+        return False
+
+    return SoupStrainer(match)
+
+
+def parse(markup, parse_only=None):
+    """Parse markup with the fastest parser, keeping only parse_only."""
+    return BeautifulSoup(markup, PARSER, parse_only=parse_only)
@@ -0,0 +1,95 @@
+"""Chapter resolve and download pipeline."""
+
+import concurrent.futures
+import queue
+
+_DONE = object()
+
+
+class ChapterPipeline:
+    """
+    Resolve chapter image lists and download chapters as two overlapping stages.
+
+    Resolver threads fetch the image list of each chapter and put it on a
+    bounded queue, download threads take chapters off the queue as soon as
+    they are resolved. The bound keeps the resolvers from running too far
+    ahead of the downloads, image URLs of some sites expire.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        resolver_threads: The number of chapters resolved at once.
+        download_threads: The number of chapters downloaded at once.
+        queue_size: The number of resolved chapters waiting to be downloaded.
+    """
+
+    def __init__(self, logger, resolver_threads, download_threads, queue_size):
+        self.logger = logger
+        self.resolver_threads = resolver_threads
+        self.download_threads = download_threads
+        self.queue_size = queue_size
+
+    def run(self, chapters, resolve, download):
+        """
+        Resolve and download chapters.
+
+        Args:
+            chapters: A list of (chapter_number, chapter_url) tuples.
+            resolve: A callable returning the image list of a chapter URL.
+            download: A callable taking a chapter number and its image list.
+        """
+        pending = queue.Queue()
+        for chapter in chapters:
+            pending.put(chapter)
+
+        resolved = queue.Queue(maxsize=self.queue_size)
+
+        def resolver():
+            while True:
+                try:
+                    chapter_number, chapter_url = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                try:
+                    images = resolve(chapter_url)
+                except Exception as e:
+                    self.logger.error("Unable to resolve Ch. %s", chapter_number)
+                    self.logger.error(e)
+                    continue
+
+                if not images:
+                    self.logger.error("No images found for Ch. %s", chapter_number)
+                    continue
+
+                resolved.put((chapter_number, images))
+
+        def downloader():
+            while True:
+                item = resolved.get()
+                if item is _DONE:
+                    return
+
+                chapter_number, images = item
+                try:
+                    download(chapter_number, images)
+                except Exception as e:
+                    self.logger.error("Unable to download Ch. %s", chapter_number)
+                    self.logger.error(e)
+
+        resolver_threads = max(min(self.resolver_threads, len(chapters)), 1)
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.download_threads
+        ) as download_executor:
+            downloaders = [
+                download_executor.submit(downloader)
+                for _ in range(self.download_threads)
+            ]
+
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=resolver_threads
+            ) as resolve_executor:
+                for _ in range(resolver_threads):
+                    resolve_executor.submit(resolver)
+
+            for _ in downloaders:
+                resolved.put(_DONE)
@@ -0,0 +1,170 @@
+"""Deciding which series a scheduled run checks."""
+
+import statistics
+import time
+from collections import Counter
+
+
+class PollSchedule:
+    """
+    How often every series is checked, learned from its release history.
+
+    The release history holds the publication date of every chapter where
+    the website tells it, otherwise the time it first appeared in the
+    chapter list. Chapters released this close together make up a release.
+    Without publication dates, the chapters listed the first time a series
+    was checked are its back catalogue and not a release. A series without
+    a new chapter for dormant_days is checked every dormant_hours, and one
+    without a new chapter for completed_days every completed_hours. Other
+    series are active. Once a series had three releases, an active series
+    is checked every quarter of the median time between them, and every run
+    from three quarters until twice that time after its last release, when
+    the next one is due. Until then its cadence is unknown and it is
+    checked every unknown_hours. Series with failed chapters are checked
+    every run. An override sets the hours between checks of a series.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        state_store: The StateStore holding the release history.
+        schedule: The minutes between runs.
+        overrides: A dict of series URL to the hours between its checks.
+        dormant_days: The days without a release before a series is dormant.
+        dormant_hours: The hours between the checks of a dormant series.
+        completed_days: The days without a release before a series is
+            considered completed.
+        completed_hours: The hours between the checks of a completed series.
+        unknown_hours: The hours between the checks of a series whose
+            cadence is not known yet.
+    """
+
+    # Chapters that first appeared this close together belong to one release.
+    release_gap = 3600
+
+    def __init__(
+        self,
+        logger,
+        state_store,
+        schedule,
+        overrides=None,
+        dormant_days=60,
+        dormant_hours=168,
+        completed_days=365,
+        completed_hours=720,
+        unknown_hours=24,
+    ):
+        self.logger = logger
+        self.state_store = state_store
+        self.schedule = schedule
+        self.overrides = overrides or {}
+        self.dormant_days = dormant_days
+        self.dormant_hours = dormant_hours
+        self.completed_days = completed_days
+        self.completed_hours = completed_hours
+        self.unknown_hours = unknown_hours
+
+    @staticmethod
+    def parse_overrides(logger, entries):
+        """
+        Return a dict of series URL to hours from "<url> <hours>" entries,
+        skipping the entries that are not.
+        """
+        overrides = {}
+        for name, value in entries.items():
+            try:
+                manga_url, hours = value.rsplit(None, 1)
+                overrides[manga_url.rstrip("/")] = float(hours)
+            except ValueError:
+                logger.warning(
+                    "Ignoring the series polling of %s, expected "
+                    "'<url> <hours>' but got '%s'",
+                    name,
+                    value,
+                )
+
+        return overrides
+
+    def releases(self, url):
+        """
+        Return the times of the releases of a series, oldest first, and
+        whether they are publication dates.
+        """
+        rows = self.state_store.release_times(url)
+        releases = []
+        for released_at, _ in rows:
+            if not releases or released_at - releases[-1] > self.release_gap:
+                releases.append(released_at)
+            else:
+                releases[-1] = released_at
+
+        return releases, bool(rows) and all(published for _, published in rows)
+
+    def interval(self, url, now=None):
+        """Return the seconds between the checks of a series and its state."""
+        now = now or time.time()
+        schedule = self.schedule * 60
+        if url in self.overrides:
+            return self.overrides[url] * 3600, "override"
+        if self.state_store.has_failures(url):
+            return schedule, "active"
+
+        releases, published = self.releases(url)
+        unknown = max(self.unknown_hours * 3600, schedule), "unknown"
+        if not releases:
+            return unknown
+
+        # No chapter appeared since the first check, or the last release.
+        since = now - releases[-1]
+        if since >= self.completed_days * 86400:
+            return max(self.completed_hours * 3600, schedule), "completed"
+        if since >= self.dormant_days * 86400:
+            return max(self.dormant_hours * 3600, schedule), "dormant"
+
+        if not published:
+            # The first release is the back catalogue, not a release date.
+            releases = releases[1:]
+        gaps = [b - a for a, b in zip(releases, releases[1:])]
+        if len(gaps) < 2:
+            return unknown
+
+        cadence = statistics.median(gaps)
+        if cadence * 0.75 <= since < cadence * 2:
+            return schedule, "due"
+
+        interval = min(cadence / 4, self.dormant_hours * 3600)
+        return max(interval, schedule), "active"
+
+    def is_due(self, url, now=None):
+        """Return True if a series should be checked now, with its state."""
+        now = now or time.time()
+        checked_at = self.state_store.checked_at(url)
+        if checked_at is None:
+            return True, "new"
+
+        interval, state = self.interval(url, now)
+        # Runs start a little later every time, half a run early is on time.
+        return now - checked_at >= interval - self.schedule * 30, state
+
+    def due(self, manga_urls):
+        """Return the series of manga_urls that should be checked now."""
+        now = time.time()
+        due = []
+        skipped = Counter()
+        for manga_url in manga_urls:
+            is_due, state = self.is_due(manga_url, now)
+            if is_due:
+                due.append(manga_url)
+            else:
+                skipped[state] += 1
+                self.logger.debug("Not checking %s (%s) yet", manga_url, state)
+
+        if skipped:
+            self.logger.info(
+                "Checking %s of %s series, not due: %s",
+                len(due),
+                len(manga_urls),
+                ", ".join(
+                    f"{count} {state}" for state, count in sorted(skipped.items())
+                ),
+            )
+
+        return due
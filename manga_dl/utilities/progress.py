@@ -1,4 +1,9 @@
 """Progress bar helper."""
+import threading
+import time
+from collections import Counter, deque
+
+from rich.filesize import decimal
 from rich.progress import BarColumn
 from rich.progress import Progress as RichProgress
 from rich.progress import (
@@ -10,25 +15,78 @@ from rich.progress import (
 from rich.text import Text
 
 
+class TransferRate:
+    """
+    The bytes received for a task and their rate over the last seconds.
+
+    Attributes:
+        window: The number of seconds the rate is averaged over.
+    """
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.total = 0
+        self._samples = deque([(time.monotonic(), 0)])
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        # Keep the last sample before the window as the base of the rate.
+        while len(self._samples) > 1 and self._samples[1][0] <= now - self.window:
+            self._samples.popleft()
+
+    def add(self, size):
+        """Count size bytes received now."""
+        now = time.monotonic()
+        with self._lock:
+            self.total += size
+            self._samples.append((now, self.total))
+            self._trim(now)
+
+    def rate(self):
+        """Return the bytes received per second over the window, None before any."""
+        now = time.monotonic()
+        with self._lock:
+            if not self.total:
+                return None
+
+            self._trim(now)
+            started, base = self._samples[0]
+            return (self.total - base) / max(now - started, 0.001)
+
+
 class CustomTransferSpeedColumn(ProgressColumn):
     """Renders human readable transfer speed."""
 
     def render(self, task) -> Text:
         """Show data transfer speed."""
-        speed = task.fields.get("speed")
+        transfer = task.fields.get("transfer")
+        speed = transfer.rate() if transfer is not None else None
         if speed is None:
             return Text("?", style="progress.data.speed", justify="center")
         return Text(
-            f"{speed} Kb/s",
+            f"{decimal(transfer.total)} {decimal(int(speed))}/s",
             style="progress.data.speed",
             justify="center",
         )
 
 
 class Progress:
-    """Progress bar helper."""
+    """
+    Progress bar helper.
 
-    def __init__(self):
+    The bytes received are counted per thread and added to the transfer rates
+    of their tasks every flush_interval seconds, so the download threads do
+    not contend for a lock on every chunk.
+
+    Attributes:
+        flush_interval: The longest time in seconds a thread keeps its bytes.
+    """
+
+    def __init__(self, flush_interval=0.2):
+        self.flush_interval = flush_interval
+        self.aggregate_task = None
+        self._transfers = {}
+        self._local = threading.local()
         self.progress = RichProgress(
             TextColumn("{task.description}", justify="left"),
             BarColumn(bar_width=None),
@@ -48,20 +106,58 @@ class Progress:
             refresh_per_second=20,
         )
 
-    def add_task(self, description, total):
-        """Add a new task to the progress bar."""
-        return self.progress.add_task(
-            description, total=total, rendered_total=total, speed=""
+    def add_task(self, description, total, aggregate=False):
+        """
+        Add a new task to the progress bar.
+
+        The bytes of every task are also counted in the aggregate task.
+        """
+        transfer = TransferRate()
+        task_id = self.progress.add_task(
+            description, total=total, rendered_total=total, transfer=transfer
         )
+        self._transfers[task_id] = transfer
+        if aggregate:
+            self.aggregate_task = task_id
+        return task_id
 
     def update(self, taskId, advance):
         """Update the progress bar."""
         self.progress.update(taskId, advance=advance)
 
+    def add_bytes(self, taskId, size):
+        """Count size bytes received for a task."""
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            pending = self._local.pending = Counter()
+            self._local.flushed = time.monotonic()
+
+        pending[taskId] += size
+        if time.monotonic() - self._local.flushed >= self.flush_interval:
+            self.flush_bytes()
+
+    def flush_bytes(self):
+        """Add the bytes counted by the calling thread to their tasks."""
+        pending = getattr(self._local, "pending", None)
+        if not pending:
+            return
+
+        for task_id, size in pending.items():
+            transfer = self._transfers.get(task_id)
+            if transfer is not None:
+                transfer.add(size)
+        aggregate = self._transfers.get(self.aggregate_task)
+        if aggregate is not None:
+            aggregate.add(sum(pending.values()))
+
+        pending.clear()
+        self._local.flushed = time.monotonic()
+
     def remove_task(self, taskId):
         """Mark a task as completed and hide it."""
         self.progress.stop_task(taskId)
         self.progress.tasks[taskId].visible = False
+        self._transfers.pop(taskId, None)
 
     def exit(self):
         """Send exit signal to the progress bar."""
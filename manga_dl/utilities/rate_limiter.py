@@ -0,0 +1,175 @@
+"""Per-host request rate limiting."""
+
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """
+    A token bucket that hands out reservations instead of blocking.
+
+    Attributes:
+        rate: The number of requests allowed per second, None for no limit.
+        burst: The number of requests that can be sent back to back.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self, now, cost=1):
+        """Take cost tokens and return how many seconds to wait before using them."""
+        wait = max(self.blocked_until - now, 0.0)
+        if self.rate is None:
+            return wait
+
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= cost
+        if self.tokens < 0:
+            wait = max(wait, -self.tokens / self.rate)
+
+        return wait
+
+    def block(self, until):
+        """Hold every request back until the given monotonic time."""
+        self.blocked_until = max(self.blocked_until, until)
+        if self.rate is not None:
+            # Start refilling from the end of the block so the waiting
+            # requests are spread out instead of all sent at once.
+            self.tokens = min(self.tokens, 0)
+            self.updated = max(self.updated, until)
+
+
+class RateLimiter:
+    """
+    A thread-safe and asyncio-safe rate limiter with a token bucket per host.
+
+    Limits are configured per domain in requests per second and also apply
+    to its subdomains. Hosts without a limit are not paced, but every host
+    is held back when a response asks for it with Retry-After or the
+    X-RateLimit headers.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        limits: A dict of domain to requests per second.
+    """
+
+    default_limits = {
+        "api.mangadex.org": 4.0,
+    }
+
+    # How long a host is held back after a 429 without a Retry-After header.
+    default_penalty = 20
+
+    def __init__(self, logger, limits=None):
+        self.logger = logger
+        self.limits = {**self.default_limits, **(limits or {})}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _domain(self, host):
+        for domain in self.limits:
+            if host == domain or host.endswith(f".{domain}"):
+                return domain
+
+        return host
+
+    def _bucket(self, url):
+        domain = self._domain(urlparse(url).hostname or "")
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            rate = self.limits.get(domain)
+            if rate is not None and rate <= 0:
+                rate = None
+            bucket = TokenBucket(rate, max(rate or 1, 1))
+            self._buckets[domain] = bucket
+
+        return bucket
+
+    def _reserve(self, url):
+        with self._lock:
+            return self._bucket(url).reserve(time.monotonic())
+
+    def acquire(self, url):
+        """Block the calling thread until a request to url may be sent."""
+        wait = self._reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url):
+        """Wait without blocking the event loop until url may be requested."""
+        wait = self._reserve(url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update(self, url, status, headers):
+        """
+        Hold back the host of url if the response asks for it.
+
+        Returns the number of seconds the host is held back for.
+        """
+        delay = self.retry_delay(status, headers)
+        if delay > 0:
+            with self._lock:
+                self._bucket(url).block(time.monotonic() + delay)
+            self.logger.info(
+                "Rate limited by %s, waiting %.1f seconds",
+                urlparse(url).hostname,
+                delay,
+            )
+
+        return delay
+
+    def retry_delay(self, status, headers):
+        """Work out from a response how long to stop sending requests."""
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            delay = self._parse_retry_after(retry_after)
+            if delay is not None:
+                return delay
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Retry-After") or headers.get(
+            "X-RateLimit-Reset"
+        )
+        if reset and (status == 429 or remaining == "0"):
+            delay = self._parse_reset(reset)
+            if delay is not None:
+                return delay
+
+        if status == 429:
+            return self.default_penalty
+
+        return 0
+
+    @staticmethod
+    def _parse_retry_after(value):
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _parse_reset(value):
+        try:
+            reset = float(value)
+        except ValueError:
+            return None
+
+        # Large values are unix timestamps, small ones a number of seconds.
+        if reset > 1_000_000_000:
+            return max(reset - time.time(), 0.0)
+
+        return max(reset, 0.0)
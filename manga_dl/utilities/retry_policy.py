@@ -0,0 +1,131 @@
+"""Retrying failed requests with exponential backoff."""
+
+import random
+import threading
+import time
+from collections import Counter
+
+
+class RetryPolicy:
+    """
+    When and how often a failed request is repeated, shared by every thread.
+
+    A rule gives the number of times a request is repeated after a network
+    error (network), a status code (429) or a status class (5xx), a status
+    code rule wins over its class. Requests that fail otherwise are not
+    repeated. The wait before every new attempt doubles from backoff up to
+    max_backoff and a random part of it is taken, so requests that failed
+    together are not repeated together. A request is given up after budget
+    seconds, the wait is cut short to fit in it.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        rules: A dict of network, a status code or a status class to the
+            number of times a request is repeated.
+        backoff: The longest wait in seconds before the first new attempt.
+        max_backoff: The longest wait in seconds before any new attempt.
+        budget: The longest time in seconds spent on a single request.
+    """
+
+    default_rules = {
+        "network": 3,
+        "408": 3,
+        "429": 5,
+        "5xx": 3,
+    }
+
+    def __init__(self, logger, rules=None, backoff=1.0, max_backoff=30.0, budget=120):
+        self.logger = logger
+        self.rules = {**self.default_rules, **(rules or {})}
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.retries = Counter()
+        self.given_up = 0
+        self._lock = threading.Lock()
+
+    def rule(self, status=None, error=None):
+        """Return the rule a failed request falls under, None if there is none."""
+        if error is not None:
+            return "network" if "network" in self.rules else None
+
+        if str(status) in self.rules:
+            return str(status)
+
+        status_class = f"{status // 100}xx"
+        if status_class in self.rules:
+            return status_class
+
+        return None
+
+    def start(self):
+        """Return the RetryAttempts of a new request."""
+        return RetryAttempts(self)
+
+    def _record(self, rule, given_up):
+        with self._lock:
+            if given_up:
+                self.given_up += 1
+            else:
+                self.retries[rule] += 1
+
+    def reset_stats(self):
+        """Reset the retry counters."""
+        with self._lock:
+            self.retries.clear()
+            self.given_up = 0
+
+    def log_stats(self):
+        """Log how many requests were repeated and given up."""
+        with self._lock:
+            retries = ", ".join(
+                f"{count} {rule}" for rule, count in sorted(self.retries.items())
+            )
+            self.logger.info(
+                "Retries: %s, %s requests given up",
+                retries or "none",
+                self.given_up,
+            )
+
+
+class RetryAttempts:
+    """
+    The attempts of a single request under a RetryPolicy.
+
+    Attributes:
+        policy: The RetryPolicy deciding whether to repeat the request.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.started = time.monotonic()
+        self.attempts = Counter()
+
+    def delay(self, status=None, error=None):
+        """
+        Return how many seconds to wait before repeating a failed request,
+        None if it should not be repeated.
+
+        Pass the status code of a failed response or the network error.
+        """
+        rule = self.policy.rule(status, error)
+        if rule is None:
+            return None
+
+        if self.attempts[rule] >= int(self.policy.rules[rule]):
+            if self.attempts[rule]:
+                self.policy._record(rule, given_up=True)
+            return None
+
+        remaining = self.policy.budget - (time.monotonic() - self.started)
+        if remaining <= 0:
+            self.policy._record(rule, given_up=True)
+            return None
+
+        retries = sum(self.attempts.values())
+        delay = random.uniform(
+            0, min(self.policy.max_backoff, self.policy.backoff * 2**retries)
+        )
+        self.attempts[rule] += 1
+        self.policy._record(rule, given_up=False)
+        return min(delay, remaining)
@@ -0,0 +1,324 @@
+"""Pooled HTTP sessions shared by the site adapters and the image downloader."""
+import contextlib
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from manga_dl.utilities.metrics import Metrics, site_of
+from manga_dl.utilities.parsing import PARSER
+from manga_dl.utilities.retry_policy import RetryPolicy
+
+
+def override_host(url, host_overrides):
+    """
+    Return url with its scheme and host replaced by the base URL the
+    host_overrides dict gives for its host, or url if there is none.
+    """
+    if not host_overrides:
+        return url
+
+    parsed = urlparse(url)
+    base_url = host_overrides.get(parsed.hostname or "")
+    if base_url is None:
+        return url
+
+    return base_url.rstrip("/") + url[len(f"{parsed.scheme}://{parsed.netloc}") :]
+
+
+class SessionPool:
+    """
+    A thread-safe pool of keep-alive HTTP sessions, one per host.
+
+    Every request to the same host reuses the same requests.Session and
+    therefore the same urllib3 connection pool, so pages and images only
+    pay for the TCP and TLS handshake once per connection.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        pool_size: The number of connections kept alive per host.
+        rate_limiter: An optional RateLimiter pacing the requests per host.
+        page_cache: An optional PageCache memoizing pages for the current run.
+        http_cache: An optional HttpCache revalidating pages across runs.
+        retry_policy: The RetryPolicy repeating failed requests, the
+            default policy if it is not given.
+        host_overrides: An optional dict of host to the base URL its
+            requests are sent to instead, such as a mirror or a test server.
+        metrics: The Metrics the requests and parsing are timed in, a
+            private one if it is not given.
+    """
+
+    # Methods repeated after a network error, which may have reached the server.
+    idempotent_methods = ("GET", "HEAD")
+
+    def __init__(
+        self,
+        logger,
+        pool_size=10,
+        rate_limiter=None,
+        page_cache=None,
+        http_cache=None,
+        retry_policy=None,
+        host_overrides=None,
+        metrics=None,
+    ):
+        self.logger = logger
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+        self.page_cache = page_cache
+        self.http_cache = http_cache
+        self.retry_policy = retry_policy or RetryPolicy(logger)
+        self.host_overrides = host_overrides or {}
+        self.metrics = metrics or Metrics(logger)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _get_session(self, host):
+        """Return the session for a host, creating it on first use."""
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=self.pool_size,
+                    pool_block=True,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+                self.logger.debug("Opened HTTP session for %s", host)
+
+            return session
+
+    def request(self, method, url, stage="page", **kwargs):
+        """
+        Send a request through the session for the URL's host.
+
+        The request, with its retries, is timed as stage in the metrics,
+        requests whose caller times them itself pass None.
+        """
+        if stage is None:
+            return self._request(method, url, **kwargs)
+
+        with self.metrics.time(stage, site_of(url)) as sample:
+            response = self._request(method, url, **kwargs)
+            sample["failed"] = response.status_code >= 400
+            if not kwargs.get("stream"):
+                sample["bytes"] = len(response.content)
+            return response
+
+    def _request(self, method, url, **kwargs):
+        recorder = getattr(self._local, "recorder", None)
+        if recorder is not None and not getattr(self._local, "in_get_page", False):
+            recorder["cacheable"] = False
+
+        session = self._get_session(urlparse(url).netloc)
+        request_url = override_host(url, self.host_overrides)
+        attempts = self.retry_policy.start()
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url)
+
+            try:
+                response = session.request(method, request_url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = None
+                if method.upper() in self.idempotent_methods:
+                    delay = attempts.delay(error=e)
+                if delay is None:
+                    raise
+
+                self.logger.warning("Retrying %s in %.1fs: %s", url, delay, e)
+                time.sleep(delay)
+                continue
+
+            held = 0
+            if self.rate_limiter is not None:
+                held = self.rate_limiter.update(
+                    url, response.status_code, response.headers
+                )
+            if response.status_code < 400:
+                return response
+
+            delay = attempts.delay(status=response.status_code)
+            if delay is None:
+                return response
+
+            response.close()
+            self.logger.warning(
+                "Retrying %s in %.1fs: returned %s", url, delay, response.status_code
+            )
+            # The rate limiter already holds the host back.
+            if not held:
+                time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        """Send a GET request."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request."""
+        return self.request("POST", url, **kwargs)
+
+    def get_page(self, url, **kwargs):
+        """
+        Send a GET request for a page that is read more than once per run.
+
+        Successful responses are kept in the page cache, so asking for the
+        same URL with the same headers and params again returns the same
+        response without a request. With an HTTP cache the page is
+        revalidated against the copy of the last run if that copy was
+        requested with the same headers.
+        """
+        recorder = getattr(self._local, "recorder", None)
+        if recorder is not None:
+            recorder["pages"].append(url)
+
+        self._local.in_get_page = True
+        try:
+            if self.page_cache is None:
+                return self._fetch_page(url, **kwargs)
+
+            return self.page_cache.get(
+                (
+                    "page",
+                    url,
+                    tuple(sorted((kwargs.get("headers") or {}).items())),
+                    repr(kwargs.get("params")),
+                ),
+                lambda: self._fetch_page(url, **kwargs),
+                cacheable=lambda response: response.status_code == 200,
+            )
+        finally:
+            self._local.in_get_page = False
+
+    def _fetch_page(self, url, headers=None, **kwargs):
+        if self.http_cache is None:
+            return self.get(url, headers=headers, **kwargs)
+
+        conditional = {}
+        # A copy requested with other headers may be another page.
+        if self.http_cache.request_headers(url) == dict(headers or {}):
+            conditional = self.http_cache.conditional_headers(url)
+        response = self.get(url, headers={**(headers or {}), **conditional}, **kwargs)
+        if response.status_code == 304:
+            cached = self.http_cache.load(url, response)
+            if cached is not None:
+                return cached
+
+            response = self.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 200:
+            self.http_cache.store(url, response, headers)
+
+        return response
+
+    @contextlib.contextmanager
+    def record_pages(self):
+        """
+        Record the pages requested by the calling thread.
+
+        Yields a dict with the list of page URLs requested through get_page
+        and whether every request went through get_page.
+        """
+        recorder = {"pages": [], "cacheable": True}
+        self._local.recorder = recorder
+        try:
+            yield recorder
+        finally:
+            self._local.recorder = None
+
+    def not_modified(self, pages):
+        """Return True if none of the cached pages changed since the last run."""
+        if self.http_cache is None:
+            return False
+
+        for url in pages:
+            headers = self.http_cache.request_headers(url)
+            if headers is None:
+                return False
+
+            response = self.get_page(url, headers=headers, timeout=30)
+            if not getattr(response, "from_cache", False):
+                return False
+
+        return True
+
+    def parse(self, response, parse_only=None, features=PARSER):
+        """
+        Parse a page response that is read once, timed in the metrics.
+
+        parse_only is a SoupStrainer limiting the document to the parts of
+        the page that are read.
+        """
+        with self.metrics.time("parse", site_of(response.url)):
+            return BeautifulSoup(response.text, features, parse_only=parse_only)
+
+    def get_soup(self, response, parse_only=None, features=PARSER):
+        """
+        Parse a page response, reusing the document parsed for it before.
+
+        parse_only is a SoupStrainer limiting the document to the parts of
+        the page that are read, the same strainer reuses the same document.
+        """
+        if self.page_cache is None:
+            return self.parse(response, parse_only, features)
+
+        cached_response, soup = self.page_cache.get(
+            ("soup", response.url, features, parse_only),
+            lambda: (response, self.parse(response, parse_only, features)),
+        )
+        if cached_response is not response:
+            return self.parse(response, parse_only, features)
+
+        return soup
+
+    def stats(self):
+        """
+        Return connection reuse counters.
+
+        A miss is a request that had to open a new connection, a hit is a
+        request that was served over an already open keep-alive connection.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        requests_sent = 0
+        connections = 0
+        for session in sessions:
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    requests_sent += pool.num_requests
+                    connections += pool.num_connections
+
+        return {
+            "hosts": len(sessions),
+            "hits": max(requests_sent - connections, 0),
+            "misses": connections,
+        }
+
+    def log_stats(self):
+        """Log the connection reuse counters."""
+        stats = self.stats()
+        self.logger.info(
+            "HTTP pool: %s hosts, %s reused connections, %s new connections",
+            stats["hosts"],
+            stats["hits"],
+            stats["misses"],
+        )
+
+    def close(self):
+        """Close every session and its pooled connections."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
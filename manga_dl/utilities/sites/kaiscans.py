@@ -8,10 +8,14 @@ Classes:
     Kaiscans: A class to interact with the website kaiscans.com.
 """
 
-import requests
-from time import sleep
-from bs4 import BeautifulSoup
-from selenium import webdriver
+import json
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+from manga_dl.utilities.metrics import site_of
+from manga_dl.utilities.parsing import page_parts, parse
 
 
 class Kaiscans:
@@ -23,6 +27,8 @@ class Kaiscans:
 
     Attributes:
         logger: An instance of log.Logger for log.
+        session: The SessionPool used for HTTP requests.
+        driver_pool: The DriverPool used to render the chapter pages.
     """
 
     base_headers = {
@@ -31,22 +37,39 @@ class Kaiscans:
             "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
         ),
     }
-    headers_image = base_headers
+    headers_image = base_headers.copy()
+
+    series_page = page_parts(
+        ("div", "id", "titlemove"),
+        ("div", "class", "eplister"),
+        ("div", "class", "wd-full"),
+        ("div", "itemprop", "description"),
+    )
+    chapter_page = page_parts(("div", "id", "readerarea"))
+
+    # How long to wait for the reader to show the chapter images.
+    page_timeout = 30
 
     def __init__(
         self,
         logger,
+        session,
+        driver_pool,
     ):
         self.logger = logger
+        self.session = session
+        self.driver_pool = driver_pool
 
     def get_manga_title(self, manga_url):
         """Get the series title for a given URL."""
         try:
             self.logger.info(f"Fetching manga title for {manga_url}")
-            response = requests.get(manga_url, headers=self.base_headers, timeout=30)
+            response = self.session.get_page(
+                manga_url, headers=self.base_headers, timeout=30
+            )
 
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, "html.parser")
+                soup = self.session.get_soup(response, self.series_page)
                 node = soup.find("div", {"id": "titlemove"})
                 title = node.h1
 
@@ -65,14 +88,14 @@ class Kaiscans:
         try:
             self.logger.info(f"Fetching manga chapters for {manga_url}")
             title = self.get_manga_title(manga_url)
-            result = requests.get(
+            result = self.session.get_page(
                 manga_url,
                 headers=self.base_headers,
                 timeout=30,
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.get_soup(result, self.series_page)
                 chapters = []
 
                 for li in soup.find("div", class_="eplister").find_all("li"):
@@ -93,32 +116,22 @@ class Kaiscans:
     def get_chapter_images(self, chapter_url):
         """
         Get the manga chapter images for a given chapter URL.
+
+        The image list is read from the reader script of the page first and
+        Chrome is only used when the page does not have one.
         """
         try:
             self.logger.info(f"Fetching chapter images for {chapter_url}")
 
-            options = webdriver.ChromeOptions()
-            options.add_argument("headless")
-            options.add_argument("no-sandbox")
-            options.add_argument("disable-dev-shm-usage")
-            options.add_argument("user-data-dir=/config/.cache/selenium")
-            driver = webdriver.Chrome(options=options)
-            driver.get(chapter_url)
-
-            sleep(5)
+            images = self.get_static_chapter_images(chapter_url)
+            if images:
+                self.driver_pool.count_chapter("static")
+                self.logger.info(f"Read chapter images for {chapter_url} from HTML")
+                return images
 
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-
-            image_nodes = soup.find("div", id="readerarea").find_all("img")
-            images = []
-            for image_node in image_nodes:
-                data_src = image_node.get("data-src")
-                if data_src:
-                    images.append(data_src.strip())
-                else:
-                    images.append(image_node["src"].strip())
-
-            driver.quit()
+            images = self.get_rendered_chapter_images(chapter_url)
+            self.driver_pool.count_chapter("browser")
+            self.logger.info(f"Read chapter images for {chapter_url} with Chrome")
 
             return images
         except Exception as e:
@@ -127,20 +140,78 @@ class Kaiscans:
 
             return None
 
+    def get_static_chapter_images(self, chapter_url):
+        """
+        Get the chapter images from the ts_reader.run({...}) script of the page.
+
+        Returns None if the page has no such script or it lists no images.
+        """
+        try:
+            result = self.session.get(
+                chapter_url, headers=self.base_headers, timeout=30
+            )
+            if result.status_code != 200:
+                return None
+
+            start = result.text.find("ts_reader.run(")
+            if start == -1:
+                return None
+
+            reader, _ = json.JSONDecoder().raw_decode(
+                result.text, start + len("ts_reader.run(")
+            )
+            for source in reader.get("sources", []):
+                images = [image.strip() for image in source.get("images", [])]
+                if images:
+                    return images
+
+        except Exception as e:
+            self.logger.debug(f"No reader script found for {chapter_url}: {e}")
+
+        return None
+
+    def get_rendered_chapter_images(self, chapter_url):
+        """
+        Get the chapter images from the page rendered by Chrome.
+        """
+        with self.driver_pool.driver() as driver:
+            with self.session.metrics.time("page", site_of(chapter_url)):
+                driver.get(chapter_url)
+                WebDriverWait(driver, self.page_timeout).until(
+                    expected_conditions.presence_of_element_located(
+                        (By.CSS_SELECTOR, "#readerarea img")
+                    )
+                )
+                page_source = driver.page_source
+
+        with self.session.metrics.time("parse", site_of(chapter_url)):
+            soup = parse(page_source, self.chapter_page)
+
+        image_nodes = soup.find("div", id="readerarea").find_all("img")
+        images = []
+        for image_node in image_nodes:
+            data_src = image_node.get("data-src")
+            if data_src:
+                images.append(data_src.strip())
+            else:
+                images.append(image_node["src"].strip())
+
+        return images
+
     def get_manga_metadata(self, manga_url):
         """
         Get the manga metadata for a given manga name.
         """
         try:
             self.logger.info(f"Fetching manga metadata for {manga_url}")
-            result = requests.get(
+            result = self.session.get_page(
                 manga_url,
                 headers=self.base_headers,
                 timeout=30,
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.get_soup(result, self.series_page)
 
                 genres_content = soup.find("div", {"class": "wd-full"})
                 genres = [a.text for a in genres_content.find_all("a")]
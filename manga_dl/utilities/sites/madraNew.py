@@ -1,9 +1,9 @@
 """
 Something"""
 
-import requests
 import re
-from bs4 import BeautifulSoup
+
+from manga_dl.utilities.parsing import page_parts
 
 
 class MadraNew:
@@ -19,23 +19,35 @@ class MadraNew:
 
     headers_image = base_headers.copy()
 
-    def __init__(self, logger):
+    series_page = page_parts(
+        ("div", "id", "manga-title"),
+        ("div", "class", "post-title"),
+        ("div", "class", "genres-content"),
+        ("div", "class", "summary__content"),
+    )
+    chapter_list = page_parts(("li", "class", "wp-manga-chapter"))
+    chapter_page = page_parts(("div", "class", "reading-content"))
+
+    def __init__(self, logger, session):
         self.logger = logger
+        self.session = session
 
     def get_manga_title(self, manga_url):
         """
         WIP"""
         try:
             self.logger.info("Getting manga title")
-            result = requests.get(manga_url, headers=self.base_headers, timeout=30)
+            result = self.session.get_page(
+                manga_url, headers=self.base_headers, timeout=30
+            )
 
             if result.status_code == 200:
                 if "setsuscans.com" in manga_url:
-                    soup = BeautifulSoup(result.text, "html.parser")
+                    soup = self.session.get_soup(result, self.series_page)
                     node = soup.find("div", {"id": "manga-title"})
                     title = node.h1
                 else:
-                    soup = BeautifulSoup(result.text, "html.parser")
+                    soup = self.session.get_soup(result, self.series_page)
                     node = soup.find("div", {"class": "post-title"})
                     title = node.h1
 
@@ -54,12 +66,12 @@ class MadraNew:
         try:
             self.logger.info("Getting manga chapters")
             title = self.get_manga_title(manga_url)
-            result = requests.post(
+            result = self.session.post(
                 url=f"{manga_url}/ajax/chapters", headers=self.base_headers, timeout=30
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.parse(result, self.chapter_list)
                 nodes = soup.find_all("li", {"class": "wp-manga-chapter"})
                 chapters = []
 
@@ -94,10 +106,12 @@ class MadraNew:
     def get_chapter_images(self, chapter_url):
         try:
             self.logger.info("Getting chapter images")
-            result = requests.get(chapter_url, headers=self.base_headers, timeout=30)
+            result = self.session.get(
+                chapter_url, headers=self.base_headers, timeout=30
+            )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.parse(result, self.chapter_page)
                 nodes = soup.find("div", {"class": "reading-content"})
                 images = []
 
@@ -120,10 +134,12 @@ class MadraNew:
         WIP"""
         try:
             self.logger.info("Getting manga metadata")
-            result = requests.get(manga_url, headers=self.base_headers, timeout=30)
+            result = self.session.get_page(
+                manga_url, headers=self.base_headers, timeout=30
+            )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.get_soup(result, self.series_page)
 
                 genres_content = soup.find("div", {"class": "genres-content"})
                 genres = [a.text for a in genres_content.find_all("a")]
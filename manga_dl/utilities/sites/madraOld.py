@@ -1,10 +1,10 @@
 """
 WIP"""
-import requests
 import re
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 
+from manga_dl.utilities.parsing import page_parts
+
 
 class MadraOld:
     """
@@ -22,20 +22,30 @@ class MadraOld:
 
     headers_image = base_headers.copy()
 
-    def __init__(self, logger):
+    series_page = page_parts(
+        ("div", "id", "manga-chapters-holder"),
+        ("div", "class", "post-title"),
+        ("div", "class", "genres-content"),
+        ("div", "class", "summary__content"),
+    )
+    chapter_list = page_parts(("li", "class", "wp-manga-chapter"))
+    chapter_page = page_parts(("div", "class", "reading-content"))
+
+    def __init__(self, logger, session):
         self.logger = logger
+        self.session = session
 
     def get_manga_title(self, manga_url):
         try:
             self.logger.info("Getting manga id and title")
-            result = requests.get(
+            result = self.session.get_page(
                 manga_url,
                 headers=self.base_headers,
                 timeout=30,
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.get_soup(result, self.series_page)
                 node = soup.find("div", {"id": "manga-chapters-holder"})
                 if node:
                     data_id = node["data-id"]
@@ -61,7 +71,7 @@ class MadraOld:
 
             if manga_id:
                 domain = "{uri.scheme}://{uri.netloc}/".format(uri=urlparse(manga_url))
-                result = requests.post(
+                result = self.session.post(
                     f"{domain}/wp-admin/admin-ajax.php",
                     headers=self.headers_post,
                     data={"action": "manga_get_chapters", "manga": manga_id},
@@ -69,7 +79,7 @@ class MadraOld:
                 )
 
                 if result.status_code == 200:
-                    soup = BeautifulSoup(result.text, "html.parser")
+                    soup = self.session.parse(result, self.chapter_list)
                     nodes = soup.find_all("li", {"class": "wp-manga-chapter"})
                     chapters = []
 
@@ -107,14 +117,14 @@ class MadraOld:
         try:
             self.logger.info("Getting chapter images")
 
-            result = requests.get(
+            result = self.session.get(
                 chapter_url,
                 headers=self.base_headers,
                 timeout=30,
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.parse(result, self.chapter_page)
                 nodes = soup.find("div", {"class": "reading-content"})
                 images = []
 
@@ -139,14 +149,14 @@ class MadraOld:
         try:
             self.logger.info("Getting manga metadata")
 
-            result = requests.get(
+            result = self.session.get_page(
                 manga_url,
                 headers=self.base_headers,
                 timeout=30,
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.get_soup(result, self.series_page)
 
                 genres_content = soup.find("div", {"class": "genres-content"})
                 genres = [a.text for a in genres_content.find_all("a")]
@@ -1,8 +1,10 @@
 """ Module for handling mangadex """ ""
-import json
+import concurrent.futures
 import re
 import time
-import requests
+from datetime import datetime
+
+from manga_dl.utilities.at_home_nodes import AtHomeNodes
 
 
 class Mangadex:
@@ -21,27 +23,50 @@ class Mangadex:
         r"([0-9a-f]{8}-[0-9a-f]{4}-[4][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12})"
     )
 
-    def __init__(self, logger):
+    # The @Home node URLs expire and are registered for failover when the
+    # chapter images are fetched, so they are never reused.
+    images_max_age = 0
+
+    # The largest page of the chapter feed the API returns.
+    feed_limit = 500
+
+    # How many pages of the chapter feed are requested at once.
+    feed_threads = 4
+
+    def __init__(self, logger, session, data_saver=False, min_speed=0):
         self.logger = logger
+        self.session = session
+        self.data_saver = data_saver
+        self.image_failover = AtHomeNodes(logger, self.get_node_url, min_speed)
+        self.release_dates = {}
+
+    def get_manga_id(self, manga_url):
+        """Get the manga id from the manga url"""
+        match = re.search(self.uuid_pattern, manga_url)
+        manga_id = match.group(1) if match else None
+        self.logger.debug("Found the following manga id: %s", manga_id)
+        return manga_id
+
+    def get_manga_attributes(self, manga_id):
+        """
+        Get the attributes of a manga.
+
+        The title and the metadata are both read from this response, which
+        is only requested once per run.
+        """
+        result = self.session.get_page(
+            f"https://api.mangadex.org/manga/{manga_id}",
+            headers=self.base_headers,
+            timeout=30,
+        )
+        result.raise_for_status()
+
+        return result.json().get("data", {}).get("attributes", {})
 
     def get_manga_title(self, manga_id):
         """Get the manga title from the manga id"""
         try:
-            while True:
-                result = requests.get(
-                    f"https://api.mangadex.org/manga/{manga_id}",
-                    headers=self.base_headers,
-                    timeout=30,
-                )
-                if result.status_code == 429:
-                    self.logger.info("Rate limited, waiting 20 seconds")
-                    time.sleep(20)
-                    continue
-                result.raise_for_status()
-                break
-
-            data = result.json()
-            attributes = data.get("data", {}).get("attributes", {})
+            attributes = self.get_manga_attributes(manga_id)
             alt_titles = attributes.get("altTitles", [])
             main_title = attributes.get("title", {}).get("en", "")
 
@@ -55,40 +80,77 @@ class Mangadex:
             return short_title
 
         except Exception as e:
-            self.logger.error(f"Unable to find the manga title on {manga_url}")
+            self.logger.error(f"Unable to find the manga title for {manga_id}")
             self.logger.error(e)
 
             return None
 
+    def get_feed_page(self, manga_id, offset):
+        """Get a page of the English chapter feed of a manga"""
+        result = self.session.get(
+            f"https://api.mangadex.org/manga/{manga_id}/feed",
+            params=[
+                ("limit", self.feed_limit),
+                ("offset", offset),
+                ("translatedLanguage[]", "en"),
+                ("contentRating[]", "safe"),
+                ("contentRating[]", "suggestive"),
+                ("contentRating[]", "erotica"),
+                ("contentRating[]", "pornographic"),
+                ("includeFutureUpdates", "1"),
+                ("order[chapter]", "asc"),
+            ],
+            headers=self.base_headers,
+            timeout=30,
+        )
+        result.raise_for_status()
+
+        return result.json()
+
+    def get_feed(self, manga_id):
+        """
+        Get every chapter in the feed of a manga.
+
+        The first page tells the total, the other pages are then requested
+        at once and paced by the rate limiter of the session.
+        """
+        first_page = self.get_feed_page(manga_id, 0)
+        total = first_page.get("total", 0)
+        offsets = range(self.feed_limit, total, self.feed_limit)
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.feed_threads
+        ) as executor:
+            pages = list(
+                executor.map(
+                    lambda offset: self.get_feed_page(manga_id, offset), offsets
+                )
+            )
+
+        feed = []
+        for page in [first_page, *pages]:
+            feed.extend(page.get("data", []))
+
+        self.logger.debug(
+            "Read %s of %s chapters in %s requests", len(feed), total, len(pages) + 1
+        )
+        return feed
+
     def get_manga_chapters(self, manga_url):
         """Get the manga chapters from the manga url, ensuring one version per chapter"""
         chapters = []
 
         try:
             self.logger.info("Getting manga chapters")
-            match = re.search(self.uuid_pattern, manga_url)
-            manga_id = match.group(1) if match else None
-            self.logger.debug("Found the following manga id: %s", manga_id)
+            manga_id = self.get_manga_id(manga_url)
             title = self.get_manga_title(manga_id)
-            while True:
-                result = requests.get(
-                    f"https://api.mangadex.org/manga/{manga_id}/feed?limit=500&translatedLanguage%5B%5D=en&contentRating%5B%5D=safe&contentRating%5B%5D=suggestive&contentRating%5B%5D=erotica&contentRating%5B%5D=pornographic&includeFutureUpdates=1&order%5Bchapter%5D=asc",
-                    headers=self.base_headers,
-                    timeout=30,
-                )
-                if result.status_code == 429:
-                    self.logger.info("Rate limited, waiting 20 seconds")
-                    time.sleep(20)
-                    continue
-                result.raise_for_status()
-                break
-
-            data = result.json()
+
             chapter_dict = {}
-            for chap in data.get("data", []):
+            for chap in self.get_feed(manga_id):
                 chapter_number = chap["attributes"]["chapter"]
                 if chapter_number not in chapter_dict:
                     chapter_dict[chapter_number] = chap["id"]
+                self.record_release_date(chapter_number, chap["attributes"])
 
             chapters = [
                 (num, chapter_dict[num])
@@ -103,30 +165,53 @@ class Mangadex:
 
             return None
 
+    def record_release_date(self, chapter_number, attributes):
+        """
+        Keep the time the first version of a chapter became readable, the
+        release history the poll schedule learns from.
+        """
+        date = attributes.get("readableAt") or attributes.get("publishAt")
+        try:
+            released_at = datetime.fromisoformat(date).timestamp()
+        except (TypeError, ValueError):
+            return
+
+        # Future updates are listed before they are released.
+        if released_at > time.time():
+            return
+        if released_at < self.release_dates.get(chapter_number, float("inf")):
+            self.release_dates[chapter_number] = released_at
+
+    def get_at_home_server(self, chapter_id):
+        """Get the MangaDex@Home node and the files of a chapter"""
+        result = self.session.get(
+            f"https://api.mangadex.org/at-home/server/{chapter_id}",
+            headers=self.base_headers,
+            timeout=30,
+        )
+        result.raise_for_status()
+
+        return result.json()
+
+    def get_node_url(self, chapter_id):
+        """Get a new MangaDex@Home node for a chapter"""
+        return self.get_at_home_server(chapter_id).get("baseUrl")
+
     def get_chapter_images(self, chapter_id):
         """Get the chapter images from the chapter id"""
         try:
             self.logger.info("Getting chapter images for %s", chapter_id)
-            while True:
-                result = requests.get(
-                    f"https://api.mangadex.org/at-home/server/{chapter_id}",
-                    headers=self.base_headers,
-                    timeout=30,
-                )
-                if result.status_code == 429:
-                    self.logger.info("Rate limited, waiting 20 seconds")
-                    time.sleep(20)
-                    continue
-                result.raise_for_status()
-                break
-
-            data = result.json()
+            data = self.get_at_home_server(chapter_id)
             base_url = data.get("baseUrl")
             chapter_hash = data["chapter"]["hash"]
-            filenames = data["chapter"]["data"]
+            if self.data_saver:
+                mode, filenames = "data-saver", data["chapter"]["dataSaver"]
+            else:
+                mode, filenames = "data", data["chapter"]["data"]
 
+            self.image_failover.register(chapter_id, base_url, chapter_hash)
             images = [
-                f"{base_url}/data/{chapter_hash}/{filename}" for filename in filenames
+                f"{base_url}/{mode}/{chapter_hash}/{filename}" for filename in filenames
             ]
 
             return images
@@ -141,24 +226,7 @@ class Mangadex:
         """Get the manga metadata from the manga url"""
         try:
             self.logger.info("Getting manga metadata")
-            match = re.search(self.uuid_pattern, manga_url)
-            manga_id = match.group(1) if match else None
-            self.logger.debug("Found the following manga id: %s", manga_id)
-            while True:
-                result = requests.get(
-                    f"https://api.mangadex.org/manga/{manga_id}",
-                    headers=self.base_headers,
-                    timeout=30,
-                )
-                if result.status_code == 429:
-                    self.logger.info("Rate limited, waiting 20 seconds")
-                    time.sleep(20)
-                    continue
-                result.raise_for_status()
-                break
-
-            data = result.json()
-            attributes = data.get("data", {}).get("attributes", {})
+            attributes = self.get_manga_attributes(self.get_manga_id(manga_url))
             tags = attributes.get("tags", [])
             genres = [tag["attributes"]["name"]["en"] for tag in tags]
             summary = attributes.get("description", {}).get("en", "")
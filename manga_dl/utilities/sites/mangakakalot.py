@@ -9,8 +9,7 @@ Classes:
 """
 import re
 
-import requests
-from bs4 import BeautifulSoup
+from manga_dl.utilities.parsing import page_parts
 
 
 class Mangakakalot:
@@ -22,6 +21,7 @@ class Mangakakalot:
 
     Attributes:
         logger: An instance of log.Logger for log.
+        session: The SessionPool used for HTTP requests.
     """
 
     base_headers = {
@@ -50,8 +50,17 @@ class Mangakakalot:
         }
     )
 
-    def __init__(self, logger):
+    series_page = page_parts(
+        ("ul", "class", "manga-info-text"),
+        ("div", "class", "story-info-right"),
+        ("div", "class", "chapter-list"),
+        ("div", "class", "panel-story-chapter-list"),
+    )
+    chapter_page = page_parts(("div", "class", "container-chapter-reader"))
+
+    def __init__(self, logger, session):
         self.logger = logger
+        self.session = session
 
     def get_manga_title(self, manga_url):
         """
@@ -59,11 +68,13 @@ class Mangakakalot:
         """
         try:
             self.logger.info(f"Fetching manga title for {manga_url}")
-            result = requests.get(manga_url, headers=self.base_headers, timeout=30)
+            result = self.session.get_page(
+                manga_url, headers=self.base_headers, timeout=30
+            )
 
             if "mangakakalot" in manga_url:
                 if result.status_code == 200:
-                    soup = BeautifulSoup(result.text, "html.parser")
+                    soup = self.session.get_soup(result, self.series_page)
                     node = soup.find("ul", {"class": "manga-info-text"})
                     title = node.h1
 
@@ -71,7 +82,7 @@ class Mangakakalot:
 
             elif "chapmanganato" in manga_url:
                 if result.status_code == 200:
-                    soup = BeautifulSoup(result.text, "html.parser")
+                    soup = self.session.get_soup(result, self.series_page)
                     node = soup.find("div", {"class": "story-info-right"})
                     title = node.h1
 
@@ -90,7 +101,7 @@ class Mangakakalot:
         try:
             self.logger.info(f"Fetching manga chapters for {manga_id}")
             title = self.get_manga_title(manga_id)
-            result = requests.get(
+            result = self.session.get_page(
                 url=f"{manga_id}",
                 headers=self.base_headers,
                 timeout=30,
@@ -98,7 +109,7 @@ class Mangakakalot:
 
             if "mangakakalot" in manga_id:
                 if result.status_code == 200:
-                    soup = BeautifulSoup(result.text, "html.parser")
+                    soup = self.session.get_soup(result, self.series_page)
                     chapter_list = soup.find("div", {"class": "chapter-list"})
                     if chapter_list is not None:
                         rows = chapter_list.find_all("div", {"class": "row"})
@@ -125,7 +136,7 @@ class Mangakakalot:
 
             elif "chapmanganato" in manga_id:
                 if result.status_code == 200:
-                    soup = BeautifulSoup(result.text, "html.parser")
+                    soup = self.session.get_soup(result, self.series_page)
                     chapter_list = soup.find(
                         "div", {"class": "panel-story-chapter-list"}
                     )
@@ -163,14 +174,14 @@ class Mangakakalot:
         """
         try:
             self.logger.info("Getting chapter images")
-            result = requests.get(
+            result = self.session.get(
                 chapter_url,
                 headers=self.base_headers,
                 timeout=30,
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.parse(result, self.chapter_page)
                 node = soup.find("div", {"class": "container-chapter-reader"})
                 image_nodes = node.find_all("img")
                 images = []
@@ -10,8 +10,7 @@ Classes:
 
 import re
 
-import requests
-from bs4 import BeautifulSoup
+from manga_dl.utilities.parsing import page_parts
 
 
 class Manganato:
@@ -23,6 +22,7 @@ class Manganato:
 
     Attributes:
         logger: An instance of log.Logger for log.
+        session: The SessionPool used for HTTP requests.
     """
 
     base_headers = {
@@ -51,8 +51,16 @@ class Manganato:
         }
     )
 
-    def __init__(self, logger):
+    series_page = page_parts(
+        ("div", "class", "story-info-right"),
+        ("ul", "class", "row-content-chapter"),
+        ("div", "class", "panel-story-info-description"),
+    )
+    chapter_page = page_parts(("div", "class", "container-chapter-reader"))
+
+    def __init__(self, logger, session):
         self.logger = logger
+        self.session = session
 
     def get_manga_title(self, manga_url):
         """
@@ -60,10 +68,12 @@ class Manganato:
         """
         try:
             self.logger.info(f"Fetching manga title for {manga_url}")
-            result = requests.get(manga_url, headers=self.base_headers, timeout=30)
+            result = self.session.get_page(
+                manga_url, headers=self.base_headers, timeout=30
+            )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.get_soup(result, self.series_page)
                 node = soup.find("div", {"class": "story-info-right"})
                 title = node.h1
 
@@ -82,14 +92,14 @@ class Manganato:
         try:
             self.logger.info(f"Fetching manga chapters for {manga_id}")
             title = self.get_manga_title(manga_id)
-            result = requests.get(
+            result = self.session.get_page(
                 url=f"{manga_id}",
                 headers=self.base_headers,
                 timeout=30,
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.get_soup(result, self.series_page)
                 chapter_list = soup.find("ul", {"class": "row-content-chapter"})
                 if chapter_list is not None:
                     rows = chapter_list.find_all("li", {"class": "a-h"})
@@ -125,14 +135,14 @@ class Manganato:
         """
         try:
             self.logger.info("Getting chapter images")
-            result = requests.get(
+            result = self.session.get(
                 chapter_url,
                 headers=self.base_headers,
                 timeout=30,
             )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.parse(result, self.chapter_page)
                 node = soup.find("div", {"class": "container-chapter-reader"})
                 image_nodes = node.find_all("img")
                 images = []
@@ -153,10 +163,12 @@ class Manganato:
         """
         try:
             self.logger.info("Getting manga metadata")
-            result = requests.get(manga_url, headers=self.base_headers, timeout=30)
+            result = self.session.get_page(
+                manga_url, headers=self.base_headers, timeout=30
+            )
 
             if result.status_code == 200:
-                soup = BeautifulSoup(result.text, "html.parser")
+                soup = self.session.get_soup(result, self.series_page)
 
                 genres = []
 
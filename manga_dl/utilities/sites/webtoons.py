@@ -8,9 +8,9 @@ Classes:
     Webtoons: A class to interact with the website webtoons.com.
 """
 import os
-import requests
 from urllib.parse import urlparse, parse_qs
-from bs4 import BeautifulSoup
+
+from manga_dl.utilities.parsing import page_parts
 
 
 class Webtoons:
@@ -22,6 +22,7 @@ class Webtoons:
 
     Attributes:
         logger: An instance of log.Logger for log.
+        session: The SessionPool used for HTTP requests.
     """
 
     USER_AGENT = (
@@ -41,15 +42,28 @@ class Webtoons:
     }
     headers_image = {"referer": "https://www.webtoons.com/", **headers}
 
-    def __init__(self, logger):
+    series_page = page_parts(
+        (None, "class", "subj"),
+        ("li", "class", "_episodeItem"),
+        ("a", "id", "_btnEpisode"),
+        ("div", "class", "info"),
+        ("p", "class", "summary"),
+    )
+    episode_list = page_parts(("li", "class", "_episodeItem"))
+    chapter_page = page_parts(("div", "class", "_img_viewer_area"))
+
+    def __init__(self, logger, session):
         self.logger = logger
+        self.session = session
 
     def get_manga_title(self, manga_url):
         """Get the series title for a given URL."""
         try:
             self.logger.info(f"Fetching manga title for {manga_url}")
-            response = requests.get(manga_url, timeout=30)
-            soup = BeautifulSoup(response.text, "html.parser")
+            response = self.session.get_page(
+                manga_url, headers=self.headers, timeout=30
+            )
+            soup = self.session.get_soup(response, self.series_page)
             title = (
                 soup.find(class_="subj")
                 .get_text(separator=" ")
@@ -66,8 +80,10 @@ class Webtoons:
         """Get the chapter viewer URL for a given URL."""
         try:
             self.logger.info(f"Fetching chapter viewer URL for {manga_url}")
-            response = requests.get(manga_url, timeout=30)
-            soup = BeautifulSoup(response.text, "html.parser")
+            response = self.session.get_page(
+                manga_url, headers=self.headers, timeout=30
+            )
+            soup = self.session.get_soup(response, self.series_page)
             chapter_viewer = soup.find("li", {"class": "_episodeItem"})
             if chapter_viewer:
                 viewer_url = chapter_viewer.find("a")
@@ -82,13 +98,15 @@ class Webtoons:
         Get the first chapter episode number for a given manga ID.
         """
         try:
-            response = requests.get(manga_url, timeout=30)
-            soup = BeautifulSoup(response.text, "html.parser")
+            response = self.session.get_page(
+                manga_url, headers=self.headers, timeout=30
+            )
+            soup = self.session.get_soup(response, self.series_page)
             href = soup.find("a", id="_btnEpisode")["href"]
             return int(parse_qs(urlparse(href).query)["episode_no"][0])
         except (TypeError, KeyError):
-            response = requests.get(f"{manga_url}&page=9999", timeout=30)
-            soup = BeautifulSoup(response.text, "html.parser")
+            response = self.session.get(f"{manga_url}&page=9999", timeout=30)
+            soup = self.session.parse(response, self.episode_list)
             return min(
                 int(episode["data-episode-no"])
                 for episode in soup.find_all("li", {"class": "_episodeItem"})
@@ -128,14 +146,14 @@ class Webtoons:
         """
         Get the manga chapter images for a given chapter URL.
         """
-        result = requests.get(
+        result = self.session.get(
             chapter_url,
             headers=self.headers,
             timeout=30,
         )
 
         if result.status_code == 200:
-            soup = BeautifulSoup(result.text, "html.parser")
+            soup = self.session.parse(result, self.chapter_page)
             node = soup.find("div", class_="viewer_img _img_viewer_area")
             image_nodes = node.find_all("img")
             images = []
@@ -150,14 +168,14 @@ class Webtoons:
         """
         Get the manga metadata for a given manga name.
         """
-        result = requests.get(
+        result = self.session.get_page(
             manga_url,
             headers=self.headers,
             timeout=30,
         )
 
         if result.status_code == 200:
-            soup = BeautifulSoup(result.text, "html.parser")
+            soup = self.session.get_soup(result, self.series_page)
 
             genres_content = soup.find("div", {"class": "info"})
             genres = [h2.text for h2 in genres_content.find_all("h2")]
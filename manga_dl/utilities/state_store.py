@@ -0,0 +1,250 @@
+"""Persistent record of the downloaded series and chapters."""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+
+
+class StateStore:
+    """
+    An SQLite database of the series and chapters seen by manga_dl.
+
+    Every chapter is stored with its status, the number of images, the size
+    of its .cbz file, the number of failed attempts and when it was last
+    updated, so deciding which chapters to download is an indexed lookup
+    instead of a listing of the series directory. A series seen for the
+    first time is imported once from the .cbz files already on disk. The
+    publication date of every chapter, where the website tells it, or else
+    the time it first appeared in the chapter list of its series, is kept
+    as the release history of the series.
+
+    Attributes:
+        logger: An instance of log.Logger for log.
+        path: The path of the SQLite database.
+    """
+
+    def __init__(self, logger, path):
+        self.logger = logger
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS series (
+                url TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                site TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                chapters INTEGER NOT NULL DEFAULT 0,
+                checked_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chapters (
+                series_url TEXT NOT NULL,
+                chapter TEXT NOT NULL,
+                url TEXT,
+                status TEXT NOT NULL,
+                images INTEGER,
+                bytes INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (series_url, chapter)
+            );
+            CREATE INDEX IF NOT EXISTS chapters_status
+                ON chapters (series_url, status);
+            CREATE TABLE IF NOT EXISTS releases (
+                series_url TEXT NOT NULL,
+                chapter TEXT NOT NULL,
+                seen_at REAL NOT NULL,
+                published INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (series_url, chapter)
+            );
+            """
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(releases)")]
+        if "published" not in columns:
+            self._db.execute(
+                "ALTER TABLE releases ADD COLUMN published INTEGER NOT NULL DEFAULT 0"
+            )
+            self._db.commit()
+
+    def register_series(self, url, title, site, directory, chapters=0):
+        """
+        Record that a series was checked.
+
+        The first time a series is seen, or when its directory was removed,
+        its chapters are imported from the .cbz files in directory.
+        """
+        with self._lock:
+            known = self._db.execute(
+                "SELECT 1 FROM series WHERE url = ?", (url,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?)",
+                (url, title, site, directory, chapters, time.time()),
+            )
+            self._db.commit()
+
+        if known is None:
+            self._import_directory(url, directory)
+        elif not os.path.isdir(directory):
+            self.logger.info("%s was removed, downloading it again", directory)
+            with self._lock:
+                self._db.execute(
+                    "DELETE FROM chapters WHERE series_url = ? AND status = ?",
+                    (url, DOWNLOADED),
+                )
+                self._db.commit()
+
+    def _import_directory(self, url, directory):
+        if not os.path.isdir(directory):
+            return
+
+        now = time.time()
+        rows = []
+        for name in os.listdir(directory):
+            match = re.fullmatch(r"Ch\. (.+)\.cbz", name)
+            if match:
+                size = os.path.getsize(os.path.join(directory, name))
+                rows.append((url, match.group(1), DOWNLOADED, size, now))
+
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO chapters "
+                "(series_url, chapter, status, bytes, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+
+        if rows:
+            self.logger.info("Imported %s chapters from %s", len(rows), directory)
+
+    def record_releases(self, url, chapters, release_dates=None):
+        """
+        Record the chapters of a series that were not listed before.
+
+        release_dates is an optional dict of chapter number to publication
+        time, which replaces the time a chapter was first seen.
+        """
+        now = time.time()
+        release_dates = release_dates or {}
+        dated = [
+            (url, str(chapter), release_dates[chapter])
+            for chapter in chapters
+            if chapter in release_dates
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO releases VALUES (?, ?, ?, 1)", dated
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO releases VALUES (?, ?, ?, 0)",
+                [(url, str(chapter), now) for chapter in chapters],
+            )
+            self._db.commit()
+
+    def release_times(self, url):
+        """
+        Return the sorted release times of the chapters of a series, each
+        with whether it is a publication date or when it was first seen.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seen_at, published FROM releases WHERE series_url = ? "
+                "ORDER BY seen_at",
+                (url,),
+            ).fetchall()
+
+        return [(seen_at, bool(published)) for seen_at, published in rows]
+
+    def checked_at(self, url):
+        """Return when a series was last checked, None if it never was."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT checked_at FROM series WHERE url = ?", (url,)
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def has_failures(self, url):
+        """Return True if a chapter of a series failed and is retried."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM chapters WHERE series_url = ? AND status = ? LIMIT 1",
+                (url, FAILED),
+            ).fetchone()
+
+        return row is not None
+
+    def downloaded_chapters(self, url):
+        """Return the chapter numbers of a series that were downloaded."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chapter FROM chapters WHERE series_url = ? AND status = ?",
+                (url, DOWNLOADED),
+            ).fetchall()
+
+        return {row[0] for row in rows}
+
+    def mark_downloaded(self, url, chapter, chapter_url, images, size):
+        """Record a chapter that was downloaded and packaged."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO chapters "
+                "(series_url, chapter, url, status, images, bytes, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (series_url, chapter) DO UPDATE SET "
+                "url = excluded.url, status = excluded.status, "
+                "images = excluded.images, bytes = excluded.bytes, "
+                "error = NULL, updated_at = excluded.updated_at",
+                (url, str(chapter), chapter_url, DOWNLOADED, images, size, time.time()),
+            )
+            self._db.commit()
+
+    def mark_failed(self, url, chapter, chapter_url, error):
+        """Record a failed attempt at downloading a chapter."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO chapters "
+                "(series_url, chapter, url, status, attempts, error, updated_at) "
+                "VALUES (?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (series_url, chapter) DO UPDATE SET "
+                "url = excluded.url, status = excluded.status, "
+                "attempts = attempts + 1, error = excluded.error, "
+                "updated_at = excluded.updated_at",
+                (url, str(chapter), chapter_url, FAILED, str(error), time.time()),
+            )
+            self._db.commit()
+
+    def record_chapter(self, url, chapter, chapter_url, images, cbz_path, completed):
+        """Record the outcome of downloading a chapter to cbz_path."""
+        if completed and os.path.exists(cbz_path):
+            self.mark_downloaded(
+                url, chapter, chapter_url, len(images), os.path.getsize(cbz_path)
+            )
+        else:
+            self.mark_failed(url, chapter, chapter_url, "incomplete download")
+
+    def failed_attempts(self, url, chapter):
+        """Return how many times downloading a chapter failed."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT attempts FROM chapters "
+                "WHERE series_url = ? AND chapter = ? AND status = ?",
+                (url, str(chapter), FAILED),
+            ).fetchone()
+
+        return row[0] if row else 0
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()